@@ -4,14 +4,27 @@ import logging
 import asyncio
 import xml.etree.ElementTree as ET
 from datetime import datetime
-from io import BytesIO
 import random
 
 import discord
 from discord.ext import commands, tasks
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
-from PIL import Image
+
+from app.core.attachments import AttachmentPipeline
+from app.core.context_cache import DEFAULT_CACHE_TTL, CachedPrefix
+from app.core.llm_scheduler import LLMOverloaded, LLMScheduler
+from app.core.message_history import MessageHistoryBuffer
+from app.core.message_router import MessageContext
+from app.core.prompt_budget import (
+    IMAGE_TOKENS,
+    PromptBudget,
+    estimate_tokens,
+    tokens_to_chars,
+)
+from app.core.streaming import StreamingReply, split_message
+from app.core.tarot_cache import TarotInterpretationCache
+from app.core.triggers import compile_triggers
 
 logger = logging.getLogger(__name__)
 
@@ -84,18 +97,80 @@ class AI(commands.Cog, name="Inteligencia Artificial Diami"):
         )
         logger.info(f"Modelo de Gemini {MODEL} inicializado.")
 
+        # Matcher de saludos compilado una sola vez (normaliza tildes, mayúsculas y puntuación)
+        self.greeting_matcher = compile_triggers(tuple(SALUDOS_COMUNES))
+
+        # Historial reciente de los canales principales, alimentado por el gateway
+        self.history = MessageHistoryBuffer()
+        # guild_id -> canal principal vigente, para descartar el buffer si el canal cambia
+        self._main_channels: dict[int, int] = {}
+        options = bot.options
+        ai_options = options.get("ai", {})
+        # Presupuestos de tokens de entrada por tipo de llamada (AI_TOKEN_BUDGET_*)
+        self.prompt_budget = PromptBudget(options.get("prompt_budget"))
+        # Todas las llamadas a Gemini pasan por el scheduler (prioridades, cuota, concurrencia)
+        self.llm_scheduler = LLMScheduler(**options.get("llm_scheduler", {}))
+        # Imágenes adjuntas: descarga en paralelo, reducción fuera del loop y caché por ID
+        self.attachment_pipeline = AttachmentPipeline()
+        # Interpretaciones de tarot reutilizables por tirada y tema de la pregunta
+        self.tarot_cache = TarotInterpretationCache(**options.get("tarot_cache", {}))
+        # Respuestas progresivas (se publica el primer fragmento y se edita) con AI_STREAMING
+        self.streaming = ai_options.get("streaming", False)
+
         self.personality_prompt = self._load_personality_prompt()
         if not self.personality_prompt:
             logger.critical(
                 "El prompt de personalidad no se pudo cargar. La IA no funcionará correctamente."
             )
 
+        # Caché de contexto de Gemini para el prompt de personalidad (AI_CONTEXT_CACHE)
+        self.personality_cache = None
+        if self.personality_prompt and ai_options.get("context_cache", True):
+            self.personality_cache = CachedPrefix(
+                MODEL,
+                self.personality_prompt,
+                self.generation_config,
+                self.safety_settings,
+                ttl=ai_options.get("context_cache_ttl", DEFAULT_CACHE_TTL),
+            )
+
         # Inicia la tarea proactiva que permite a Diami unirse a conversaciones de forma autónoma.
         self.proactive_conversation_task.start()
 
-    def cog_unload(self):
+    async def cog_load(self):
+        """Registra los handlers de mensajes del canal principal en el router central."""
+        # El registro del historial va primero: no tiene awaits, así que el mensaje ya está
+        # en el buffer cuando el handler de respuesta arma el prompt.
+        self.bot.message_router.register(
+            self.record_main_channel_message, roles=("main",), include_bots=True
+        )
+        self.bot.message_router.register(
+            self.on_main_channel_message, roles=("main",), trigger=self._is_addressed
+        )
+        self.bot.db_manager.channel_index.subscribe(self._on_guild_channels)
+        if self.personality_cache:
+            self.personality_cache.start()
+
+    async def cog_unload(self):
         """Asegura que la tarea se detenga si el cog se descarga."""
         self.proactive_conversation_task.cancel()
+        self.llm_scheduler.close()
+        scheduler = self.llm_scheduler.stats()
+        logger.info(
+            f"Cola de la IA: {scheduler['completed']} peticiones completadas, "
+            f"{scheduler['shed']} descartadas por saturación."
+        )
+        self.bot.message_router.unregister(self.record_main_channel_message)
+        self.bot.message_router.unregister(self.on_main_channel_message)
+        self.bot.db_manager.channel_index.unsubscribe(self._on_guild_channels)
+        if self.personality_cache:
+            await self.personality_cache.close()
+        await self.tarot_cache.save(force=True)
+        tarot = self.tarot_cache.stats()
+        logger.info(
+            f"Caché de tarot: {tarot['size']} lecturas, {tarot['hits']} reutilizadas, "
+            f"{tarot['misses']} generadas."
+        )
 
     def _load_personality_prompt(self) -> str | None:
 
@@ -116,22 +191,30 @@ class AI(commands.Cog, name="Inteligencia Artificial Diami"):
             )
             return None
 
-    async def _get_message_history_xml(self, channel: discord.TextChannel) -> str:
+    async def _get_message_history_xml(
+        self, channel: discord.TextChannel, max_tokens: int | None = None
+    ) -> str:
 
-        history_parts = []
-        async for old_message in channel.history(limit=100):
-            content = discord.utils.escape_markdown(old_message.content)
-            content = discord.utils.escape_mentions(content)
-            if old_message.attachments:
-                content += (
-                    f" [El usuario adjuntó {len(old_message.attachments)} imagen(es)]"
-                )
-            history_parts.append(
-                f"<mensaje><usuario>{old_message.author.display_name}</usuario><contenido>{content.strip()}</contenido></mensaje>"
+        # Los fragmentos <mensaje> están memorizados por mensaje en el buffer
+        max_chars = None
+        if max_tokens is not None:
+            max_chars = tokens_to_chars(max_tokens) - len(
+                "<historial_chat>\n</historial_chat>"
             )
-        history_parts.reverse()
-        history_str = "\n".join(history_parts)
-        return f"<historial_chat>\n{history_str}\n</historial_chat>"
+        history_str = await self.history.render(channel, max_chars)
+        return f"<historial_chat>\n{history_str}</historial_chat>"
+
+    @staticmethod
+    def _context_xml(user_name: str, history_xml: str, user_input: str) -> str:
+        timestamp_xml = f"<timestamp_actual>{datetime.now().strftime('%A, %H:%M')}</timestamp_actual>"
+        return f"""
+<contexto_actual_y_tarea>
+    {timestamp_xml}
+    <usuario_actual>{user_name}</usuario_actual>
+    {history_xml}
+    <input_del_usuario>{user_input}</input_del_usuario>
+</contexto_actual_y_tarea>
+"""
 
     async def _generate_gemini_response(
         self,
@@ -139,99 +222,218 @@ class AI(commands.Cog, name="Inteligencia Artificial Diami"):
         user_name: str,
         user_input: str,
         attachments: list = [],
+        call_type: str | None = None,
+        guild_id: int | None = None,
+        on_text=None,
     ):
         """
         Genera una respuesta usando Gemini, diferenciando entre prompts normales y comandos internos.
         Si el prompt inicia con '>>command>>', se prioriza la tarea y se omite el contexto de canal.
+
+        `call_type` ('mention', 'greeting', 'proactive', 'tarot', 'welcome' o 'command') define
+        la prioridad en el scheduler y el presupuesto de tokens (los comandos internos usan el
+        de 'command'): el historial se recorta desde los mensajes más antiguos hasta que entre.
+        `guild_id` se usa para repartir la cola del scheduler entre servidores.
+        Si se pasa `on_text` (corrutina que recibe texto), la respuesta se genera en streaming
+        y cada fragmento se entrega a medida que llega; igual se retorna el texto completo.
+
+        Raises:
+            LLMOverloaded: Si el scheduler descarta la petición por saturación.
+
+        Si el caché de contexto está vigente, la personalidad no se envía: ya está en el
+        contenido cacheado del modelo.
         """
-        prompt_parts = [self.personality_prompt]
+        is_command = user_input.strip().startswith(">>command>>")
+        call_type = call_type or ("command" if is_command else "mention")
+        budget_type = "command" if is_command else call_type
+        if guild_id is None and channel is not None:
+            guild_id = channel.guild.id
+        prompt_parts = []
+        estimated_tokens = estimate_tokens(self.personality_prompt)
         # Detectar si es un comando interno
-        if user_input.strip().startswith(">>command>>"):
+        if is_command:
             # Solo se envía el prompt de personalidad y el comando, sin contexto adicional
             prompt_parts.append(user_input)
+            estimated_tokens += estimate_tokens(user_input)
             # Las imágenes no se envían en comandos internos
         else:
+            images = (
+                await self.attachment_pipeline.prepare(attachments) if attachments else []
+            )
             # Prompt normal: agregar contexto de canal, historial y timestamp
             if channel is not None:
-                history_xml = await self._get_message_history_xml(channel)
-                timestamp_xml = f"<timestamp_actual>{datetime.now().strftime('%A, %H:%M')}</timestamp_actual>"
-                context_and_task = f"""
-<contexto_actual_y_tarea>
-    {timestamp_xml}
-    <usuario_actual>{user_name}</usuario_actual>
-    {history_xml}
-    <input_del_usuario>{user_input}</input_del_usuario>
-</contexto_actual_y_tarea>
-"""
+                fixed_tokens = (
+                    estimated_tokens
+                    + estimate_tokens(self._context_xml(user_name, "", user_input))
+                    + IMAGE_TOKENS * len(images)
+                )
+                history_xml = await self._get_message_history_xml(
+                    channel, self.prompt_budget.remaining(budget_type, fixed_tokens)
+                )
+                context_and_task = self._context_xml(user_name, history_xml, user_input)
                 prompt_parts.append(context_and_task)
+                estimated_tokens += estimate_tokens(context_and_task)
             # Adjuntar imágenes si existen
-            if attachments:
+            if images:
                 prompt_parts.append(
                     "\nEl usuario también ha adjuntado la(s) siguiente(s) imagen(es):"
                 )
-                for attachment in attachments:
-                    image_bytes = await attachment.read()
-                    img = Image.open(BytesIO(image_bytes))
-                    prompt_parts.append(img)
+                prompt_parts.extend(images)
+                estimated_tokens += IMAGE_TOKENS * len(images)
         logger.info(
             f"Enviando prompt a Gemini. Tarea para: {user_name}. Input: '{user_input[:50]}...'"
         )
-        response = await self.model.generate_content_async(prompt_parts)
+        cached_model = self.personality_cache.model() if self.personality_cache else None
+        if cached_model is not None and prompt_parts:
+            model = cached_model
+        else:
+            model = self.model
+            prompt_parts.insert(0, self.personality_prompt)
+
+        async def generate():
+            if on_text is None:
+                return await model.generate_content_async(prompt_parts)
+            response = await model.generate_content_async(prompt_parts, stream=True)
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:  # Fragmento sin texto (ej. cierre por seguridad)
+                    continue
+                if text:
+                    await on_text(text)
+            return response
+
+        response = await self.llm_scheduler.submit(generate, call_type, guild_id)
+        self._log_token_usage(budget_type, estimated_tokens, response)
         return response.text
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot or not message.guild:
-            return
+    def _log_token_usage(self, call_type: str, estimated_tokens: int, response):
+        """Registra los tokens de entrada estimados frente a los reales informados por Gemini."""
+        usage = getattr(response, "usage_metadata", None)
+        actual_tokens = getattr(usage, "prompt_token_count", None)
+        cached_tokens = getattr(usage, "cached_content_token_count", None) or 0
+        budget = self.prompt_budget.budget(call_type)
+        logger.info(
+            f"Tokens de entrada ({call_type}): estimados {estimated_tokens}, "
+            f"reales {actual_tokens if actual_tokens is not None else '?'} "
+            f"({cached_tokens} cacheados), presupuesto {budget}"
+        )
+        if estimated_tokens > budget:
+            logger.warning(
+                f"El prompt ({call_type}) supera el presupuesto de tokens: {estimated_tokens}/{budget}."
+            )
 
-        # --- Lógica de Interacción ---
-        # 1. Mención directa o respuesta al bot (siempre responde)
-        is_mention = self.bot.user in message.mentions
-        is_reply = (
+    def _is_direct(self, message: discord.Message) -> bool:
+        """Mención directa o respuesta a un mensaje del bot."""
+        if self.bot.user in message.mentions:
+            return True
+        return bool(
             message.reference
             and message.reference.resolved
             and message.reference.resolved.author == self.bot.user
         )
 
-        # 2. Saludo aleatorio (probabilidad baja)
-        is_greeting = any(
-            saludo in message.content.lower().split() for saludo in SALUDOS_COMUNES
+    def _is_greeting(self, message: discord.Message) -> bool:
+        return self.greeting_matcher.match(message.content) is not None
+
+    def _is_addressed(self, message: discord.Message) -> bool:
+        """Trigger del router: solo interesan menciones, respuestas al bot y saludos."""
+        return self._is_direct(message) or self._is_greeting(message)
+
+    async def record_main_channel_message(self, context: MessageContext):
+        """Handler del router: guarda cada mensaje del canal principal (incluidos los de Diami)."""
+        self.history.append(context.message)
+
+    def _on_guild_channels(self, guild_id: int, channels: dict):
+        """
+        Si el canal principal de un guild cambió, descarta el buffer del canal anterior y el
+        del nuevo: mientras no eran el canal principal no se registraron sus mensajes.
+        """
+        main_channel_id = channels.get("main")
+        previous = self._main_channels.get(guild_id)
+        if guild_id in self._main_channels and previous != main_channel_id:
+            for channel_id in (previous, main_channel_id):
+                if channel_id:
+                    self.history.forget(channel_id)
+        self._main_channels[guild_id] = main_channel_id
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Tras un (re)IDENTIFY pudieron perderse eventos: el historial se vuelve a pedir."""
+        self.history.clear()
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        """Mantiene el historial al día con las ediciones (solo toca canales con buffer)."""
+        if "content" not in payload.data:
+            return
+        attachments = payload.data.get("attachments")
+        self.history.edit(
+            payload.channel_id,
+            payload.message_id,
+            payload.data["content"],
+            len(attachments) if attachments is not None else None,
         )
-        should_greet = (
-            is_greeting and random.random() < 0.15
-        )  # 15% de probabilidad de responder a un saludo
 
-        if not (is_mention or is_reply or should_greet):
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self.history.delete(payload.channel_id, (payload.message_id,))
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(
+        self, payload: discord.RawBulkMessageDeleteEvent
+    ):
+        self.history.delete(payload.channel_id, payload.message_ids)
+
+    async def on_main_channel_message(self, context: MessageContext):
+        """
+        Handler del router para los mensajes del canal principal que mencionan a Diami,
+        le responden o saludan.
+        """
+        message = context.message
+
+        # --- Lógica de Interacción ---
+        # 1. Mención directa o respuesta al bot (siempre responde)
+        is_direct = self._is_direct(message)
+
+        # 2. Saludo aleatorio: 15% de probabilidad de responder
+        if not is_direct and random.random() >= 0.15:
             return
 
-        # Verificar canal principal y personalidad cargada
+        # Verificar personalidad cargada
         if not self.personality_prompt:
             return
-        try:
-            config = await self.bot.db_manager.get_guild_config(message.guild.id)
-            if not config or message.channel.id != config.get("main_channel_id"):
-                return
-        except Exception as e:
-            logger.error(
-                f"Error al obtener config del guild en on_message: {e}",
-                extra={"guild_id": message.guild.id},
-            )
-            return
 
         async with message.channel.typing():
             try:
                 user_input = message.content
-                if is_greeting and not (is_mention or is_reply):
+                if not is_direct:
                     user_input += "\n(Acabas de ver a este usuario saludar en el canal y decidiste responder por iniciativa propia)."
 
+                stream = None
+                if self.streaming:
+                    stream = StreamingReply(message.reply, message.channel.send)
                 response_text = await self._generate_gemini_response(
                     message.channel,
                     message.author.display_name,
                     user_input,
                     message.attachments,
+                    call_type="mention" if is_direct else "greeting",
+                    on_text=stream.feed if stream else None,
+                )
+                if stream:
+                    await stream.finish()
+                elif response_text:
+                    # Las respuestas largas se dividen en el límite de 2000 caracteres
+                    parts = split_message(response_text)
+                    await message.reply(parts[0])
+                    for part in parts[1:]:
+                        await message.channel.send(part)
+            except LLMOverloaded:
+                logger.warning(
+                    "Respuesta descartada: la cola de la IA está saturada.",
+                    extra={"guild_id": message.guild.id},
                 )
-                if response_text:
-                    await message.reply(response_text)
             except Exception as e:
                 logger.error(
                     f"Error en on_message con Gemini: {e}",
@@ -253,15 +455,17 @@ class AI(commands.Cog, name="Inteligencia Artificial Diami"):
             return
 
         logger.info("Tarea proactiva iniciada, buscando un servidor activo...")
+        configs = await self.bot.db_manager.get_guild_configs(
+            guild.id for guild in self.bot.guilds
+        )
         # Iterar sobre todos los servidores donde está el bot
         for guild in self.bot.guilds:
             try:
-                config = await self.bot.db_manager.get_guild_config(guild.id)
-                if not config or not config.get("main_channel_id"):
+                config = configs.get(guild.id)
+                if not config or not config.main_channel_id:
                     continue
 
-                channel_id = config.get("main_channel_id")
-                channel = guild.get_channel(channel_id)
+                channel = guild.get_channel(config.main_channel_id)
 
                 if not channel or not isinstance(channel, discord.TextChannel):
                     continue
@@ -285,9 +489,15 @@ class AI(commands.Cog, name="Inteligencia Artificial Diami"):
                         # Le damos a la IA el contexto y una orden específica
                         user_input = "(Has estado observando la conversación en silencio y decides unirte. Lee el historial y haz un comentario relevante, una pregunta o una broma para integrarte a la charla. No saludes, simplemente continúa la conversación existente)."
 
-                        response_text = await self._generate_gemini_response(
-                            channel, "Diami", user_input
-                        )
+                        try:
+                            response_text = await self._generate_gemini_response(
+                                channel, "Diami", user_input, call_type="proactive"
+                            )
+                        except LLMOverloaded:
+                            logger.info(
+                                "Tarea proactiva omitida: la cola de la IA está saturada."
+                            )
+                            return
                         if response_text:
                             await channel.send(response_text)
 
@@ -304,7 +514,9 @@ class AI(commands.Cog, name="Inteligencia Artificial Diami"):
         """Espera a que el bot esté completamente listo antes de iniciar la tarea."""
         await self.bot.wait_until_ready()
 
-    async def interpretar_tarot(self, user: str, pregunta: str, cartas: list) -> str:
+    async def interpretar_tarot(
+        self, user: str, pregunta: str, cartas: list, guild_id: int | None = None
+    ) -> str:
         """
         Genera una interpretación de las cartas del tarot para una pregunta dada.
         Utiliza el modelo Gemini para crear una respuesta personalizada.
@@ -314,10 +526,19 @@ class AI(commands.Cog, name="Inteligencia Artificial Diami"):
             pregunta (str): La pregunta realizada por el usuario.
             cartas (list): Lista de tuplas (nombre_carta, orientacion), por ejemplo:
                 [("El Loco", "derecha"), ("La Muerte", "invertida"), ...]
+            guild_id (int, opcional): Servidor de origen, para la cola del scheduler.
 
         Returns:
             str: Interpretación generada por Diami.
+
+        Las interpretaciones se memorizan por tirada y tema de la pregunta; un acierto se
+        reutiliza según `TAROT_CACHE_REUSE` y si no se genera una lectura nueva.
         """
+        cached = self.tarot_cache.get(cartas, pregunta)
+        if cached is not None:
+            logger.info("Interpretación de tarot reutilizada del caché.")
+            return cached
+
         # Construir el prompt para la IA
         cartas_descripcion = "\n".join(
             [
@@ -338,7 +559,12 @@ class AI(commands.Cog, name="Inteligencia Artificial Diami"):
                 user,  # Nombre de la IA
                 prompt,
                 [],  # Sin adjuntos
+                call_type="tarot",
+                guild_id=guild_id,
             )
+            if response:
+                self.tarot_cache.set(cartas, pregunta, response)
+                await self.tarot_cache.save()
             return (
                 response
                 if response
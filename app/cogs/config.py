@@ -143,7 +143,7 @@ class StatusGroup(app_commands.Group):
         }
         channel_text = ""
         for key, name in channel_map.items():
-            channel_id = config.get(key)
+            channel_id = getattr(config, key)
             value = "❌ *Sin configurar*"
             if channel_id:
                 channel = interaction.guild.get_channel(channel_id)
@@ -159,9 +159,8 @@ class StatusGroup(app_commands.Group):
         }
 
         feature_text = ""
-        features = config.get("features", {})
         for key, name in feature_map.items():
-            status = features.get(key, False)
+            status = config.has_feature(key)
             status_emoji = "✅ Activado" if status else "❌ Desactivado"
             feature_text += f"**{name}:** {status_emoji}\n"
         embed.add_field(
@@ -9,8 +9,10 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import random
-from PIL import Image
+import asyncio
 
+from app.core.dice import DiceError, compile_expression, distribution, roll
+from app.core.tarot_renderer import TarotRenderer
 
 logger = logging.getLogger(__name__)
 
@@ -18,28 +20,20 @@ logger = logging.getLogger(__name__)
 # DATOS CONSTANTES
 # ==============================================================================
 
-ROLL_ICON = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-    "assets",
-    "images",
-    "icons",
-    "dice.png",
-)
-
-TAROT_ICON = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-    "assets",
-    "images",
-    "icons",
-    "tarot.png",
-)
-
 TAROT_FOLDER = os.path.join(
     os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
     "assets",
     "images",
     "tarot",
 )
+# Segundos que se espera la interpretación antes de enviar la imagen sola
+TAROT_AI_TIMEOUT = 8.0
+# Tiempo máximo total para completar la interpretación con una edición posterior
+TAROT_AI_FOLLOWUP_TIMEOUT = 90.0
+TAROT_PENDING_TEXT = "🔮 Diami está leyendo las cartas..."
+# Dados por término que se muestran uno a uno en el resultado de /roll
+MAX_DADOS_DETALLE = 40
+
 ARCANOS = [
     "the_fool.jpg",
     "the_magician.jpg",
@@ -73,6 +67,19 @@ ARCANOS = [
 class Fun(commands.Cog, name="Diversion"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        # Renderizador de tiradas en un pool de procesos con las cartas pre-decodificadas
+        self.tarot_renderer = TarotRenderer(
+            TAROT_FOLDER, ARCANOS, **bot.options.get("tarot_renderer", {})
+        )
+        self.tarot_ai_timeout = bot.options.get("tarot", {}).get(
+            "ai_timeout", TAROT_AI_TIMEOUT
+        )
+
+    async def cog_load(self):
+        await self.tarot_renderer.start()
+
+    async def cog_unload(self):
+        self.tarot_renderer.close()
 
     # ==============================================================================
     # Comando de Tarot
@@ -92,6 +99,10 @@ class Fun(commands.Cog, name="Diversion"):
         """
         Comando principal de tarot. Selecciona 3 cartas únicas, decide su orientación y genera una imagen.
         Envía una respuesta deferida para evitar que la interacción expire mientras procesa la IA.
+
+        La interpretación de la IA y el renderizado de la imagen corren en paralelo. Si la IA
+        tarda más de `tarot_ai_timeout`, se envía la tirada sin interpretación y el mensaje
+        se edita cuando llega.
         """
         # Deferir la respuesta para evitar timeout de Discord
         await interaction.response.defer()
@@ -100,40 +111,24 @@ class Fun(commands.Cog, name="Diversion"):
         cartas = random.sample(ARCANOS, 3)
         orientaciones = [random.choice(["derecha", "invertida"]) for _ in cartas]
 
-        # Cargar imágenes y aplicar orientación
-        imagenes = []
-        for carta, orientacion in zip(cartas, orientaciones):
-            path = os.path.join(TAROT_FOLDER, carta)
-            img = Image.open(path)
-            if orientacion == "invertida":
-                img = img.rotate(180)
-            imagenes.append(img)
-
-        # Crear imagen final con margen entre cartas
-        margen = 20
-        ancho_total = sum(img.width for img in imagenes) + margen * 2
-        alto_max = max(img.height for img in imagenes)
-        resultado = Image.new("RGBA", (ancho_total, alto_max), (255, 255, 255, 0))
-        x = margen
-        for img in imagenes:
-            resultado.paste(
-                img,
-                (x, (alto_max - img.height) // 2),
-                img if img.mode == "RGBA" else None,
+        # Pedir la interpretación de Diami antes de renderizar, para que ambas corran juntas
+        interpretacion_task = asyncio.ensure_future(
+            self._interpretar_tarot(interaction, ask, cartas, orientaciones)
+        )
+
+        # Componer y codificar la tirada fuera del event loop
+        try:
+            imagen = await self.tarot_renderer.render(
+                [(c, o == "invertida") for c, o in zip(cartas, orientaciones)]
             )
-            x += img.width
-        # Guardar imagen temporal
-        # temp_path = os.path.join(
-        #     TAROT_FOLDER, f"temp_tarot_{interaction.user.name}.png"
-        # )
-        # resultado.save(temp_path)
-        buffer = BytesIO()
-        resultado.save(buffer, format="PNG")
-        buffer.seek(0)
+        except Exception:
+            interpretacion_task.cancel()
+            raise
+        filename = self.tarot_renderer.filename
 
         files = [
-            discord.File(fp=buffer, filename="tarot.png"),
-            discord.File(TAROT_ICON, filename="thumbnail.png"),
+            discord.File(fp=BytesIO(imagen), filename=filename),
+            self.bot.assets.file("icons/tarot.png", filename="thumbnail.png"),
         ]
 
         # Construir mensaje de resultado
@@ -143,39 +138,14 @@ class Fun(commands.Cog, name="Diversion"):
         ]
         descripcion = f"Pregunta: {ask}\n\nCartas:\n" + "\n".join(cartas_info)
 
-        # Obtener interpretación de Diami usando IA
-        ai_cog = self.bot.get_cog("Inteligencia Artificial Diami")
-        interpretacion = None
-        if ai_cog:
-            # Preparamos la lista de cartas para la IA (nombre, orientación)
-            cartas_para_ia = [
-                (os.path.splitext(c)[0].replace("_", " ").title(), o)
-                for c, o in zip(cartas, orientaciones)
-            ]
-            # Formatear la lista de cartas seleccionadas como string legible
-            cartas_str = ", ".join(
-                [f"{nombre}({orientacion})" for nombre, orientacion in cartas_para_ia]
-            )
-            # Loguear el formato solicitado para mayor claridad
-            logger.info(
-                f"Cartas seleccionadas: {cartas_str}",
-                extra={"guild_id": interaction.guild.id},
-            )
-            try:
-                interpretacion = await ai_cog.interpretar_tarot(
-                    interaction.user.name, ask, cartas_para_ia
-                )
-            except Exception as e:
-                logger.error(
-                    f"Error al obtener interpretación de tarot: {e}",
-                    extra={"guild_id": interaction.guild.id},
-                )
-                interpretacion = "No se pudo obtener la interpretación de las cartas."
-        else:
-            interpretacion = "La IA no está disponible para interpretar las cartas."
+        # Esperar la interpretación solo hasta el timeout; si no llegó, se completa después
+        done, _ = await asyncio.wait(
+            {interpretacion_task}, timeout=self.tarot_ai_timeout
+        )
+        interpretacion = interpretacion_task.result() if done else TAROT_PENDING_TEXT
 
         # Enviar imagen y resultados como respuesta usando followup
-        # Adjuntar la imagen al embed correctamente usando 'url' y 'attachment://tarot.png'
+        # Adjuntar la imagen al embed correctamente usando 'url' y 'attachment://<archivo>'
         embed = discord.Embed(
             title="Lectura de Tarot",
             description=descripcion,
@@ -188,71 +158,153 @@ class Fun(commands.Cog, name="Diversion"):
         embed.set_footer(text="DiamiBot - Tarot IA")
         # Adjuntar la imagen al embed
         # file = discord.File(temp_path, filename="tarot.png")
-        embed.set_image(url="attachment://tarot.png")
-        await interaction.followup.send(embed=embed, files=files)
+        embed.set_image(url=f"attachment://{filename}")
+        mensaje = await interaction.followup.send(embed=embed, files=files, wait=True)
         # Eliminar imagen temporal
         # os.remove(temp_path)
 
+        if not done:
+            await self._completar_interpretacion(
+                interaction, mensaje, embed, interpretacion_task
+            )
+
+    async def _interpretar_tarot(
+        self,
+        interaction: discord.Interaction,
+        ask: str,
+        cartas: list,
+        orientaciones: list,
+    ) -> str:
+        """Obtiene la interpretación de Diami usando IA (nunca lanza: retorna un texto)."""
+        ai_cog = self.bot.get_cog("Inteligencia Artificial Diami")
+        if not ai_cog:
+            return "La IA no está disponible para interpretar las cartas."
+
+        # Preparamos la lista de cartas para la IA (nombre, orientación)
+        cartas_para_ia = [
+            (os.path.splitext(c)[0].replace("_", " ").title(), o)
+            for c, o in zip(cartas, orientaciones)
+        ]
+        # Formatear la lista de cartas seleccionadas como string legible
+        cartas_str = ", ".join(
+            [f"{nombre}({orientacion})" for nombre, orientacion in cartas_para_ia]
+        )
+        # Loguear el formato solicitado para mayor claridad
+        logger.info(
+            f"Cartas seleccionadas: {cartas_str}",
+            extra={"guild_id": interaction.guild.id},
+        )
+        try:
+            return await ai_cog.interpretar_tarot(
+                interaction.user.name, ask, cartas_para_ia, interaction.guild_id
+            )
+        except Exception as e:
+            logger.error(
+                f"Error al obtener interpretación de tarot: {e}",
+                extra={"guild_id": interaction.guild.id},
+            )
+            return "No se pudo obtener la interpretación de las cartas."
+
+    async def _completar_interpretacion(
+        self,
+        interaction: discord.Interaction,
+        mensaje: discord.WebhookMessage,
+        embed: discord.Embed,
+        interpretacion_task: asyncio.Future,
+    ):
+        """Edita la lectura ya enviada con la interpretación que llegó tarde."""
+        try:
+            interpretacion = await asyncio.wait_for(
+                interpretacion_task, timeout=TAROT_AI_FOLLOWUP_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            interpretacion = "Las cartas guardan silencio por ahora... inténtalo más tarde."
+
+        # Se edita el embed construido localmente: el que devuelve Discord trae URLs firmadas
+        # del CDN que expiran, mientras que 'attachment://' sigue apuntando a los adjuntos
+        embed.set_field_at(
+            0, name="Interpretación de Diami", value=interpretacion, inline=False
+        )
+        try:
+            await mensaje.edit(embed=embed)
+        except discord.HTTPException as e:
+            logger.error(
+                f"No se pudo completar la lectura de tarot: {e}",
+                extra={"guild_id": interaction.guild.id},
+            )
+
     # ==============================================================================
     # Comando de lanzamiento de dados
     # ==============================================================================
     @app_commands.command(
         name="roll",
-        description="🎲 Lanza dados con notación D&D (ej: 2D6+3) y muestra el resultado.",
+        description="🎲 Lanza dados con notación D&D (ej: 4d6kh3+2) o calcula sus probabilidades.",
+    )
+    @app_commands.describe(
+        tirada="Expresión de la tirada (ejemplo: 1D20+2, 4d6kh3, 2d20kl1, 3d6!, 2d6r1+1d4)",
+        modo="Tirar los dados o ver la distribución de resultados",
+        objetivo="Opcional: en modo estadísticas, probabilidad de sacar este valor o más",
+    )
+    @app_commands.choices(
+        modo=[
+            app_commands.Choice(name="Tirar", value="tirar"),
+            app_commands.Choice(name="Estadísticas", value="stats"),
+        ]
     )
-    @app_commands.describe(tirada="Expresión de la tirada (ejemplo: 1D20+2, 2D6-1, D8)")
-    async def dado(self, interaction: discord.Interaction, tirada: str):
+    async def dado(
+        self,
+        interaction: discord.Interaction,
+        tirada: str,
+        modo: str = "tirar",
+        objetivo: int | None = None,
+    ):
         """
         Comando para lanzar dados usando la notación estándar de D&D.
-        Permite expresiones como 1D20+2, 2D6-1, D8, etc.
+        Permite expresiones de varios términos como 1D20+2, 4d6kh3+2d8+5, 3d6! o 2d6r1,
+        y en modo estadísticas muestra la distribución exacta del total.
         """
         await interaction.response.defer(thinking=True)
 
         try:
-            # Parseo de la expresión de tirada
-            import re
-
-            patron = r"^(?:(\d*)[dD](\d+))([+-]?\d+)?$"
-            match = re.match(patron, tirada.replace(" ", ""))
-
-            if not match:
-                await interaction.followup.send(
-                    "❌ Formato inválido. Usa el formato XdY+Z, por ejemplo: 2D6+1, D20, 1d8-2."
-                )
-                return
-
-            cantidad = int(match.group(1)) if match.group(1) else 1
-            caras = int(match.group(2))
-            modificador = int(match.group(3)) if match.group(3) else 0
-            if cantidad < 1 or cantidad > 100 or caras < 2 or caras > 1000:
+            # Parseo de la expresión de tirada (el AST compilado queda memorizado)
+            try:
+                expresion = compile_expression(tirada)
+            except DiceError as e:
                 await interaction.followup.send(
-                    "❌ Cantidad de dados (1-100) o caras (2-1000) fuera de rango permitido."
+                    f"❌ {e} Usa el formato XdY+Z, por ejemplo: 2D6+1, D20, 4d6kh3, 1d8-2."
                 )
                 return
 
-            # Lanzar los dados
-            resultados = [random.randint(1, caras) for _ in range(cantidad)]
-            suma = sum(resultados) + modificador
-
-            # Construir mensaje de resultado
-            detalle = f"{' + '.join(map(str, resultados))}"
-            if modificador:
-                detalle += f" {'+' if modificador > 0 else '-'} {abs(modificador)}"
             embed = discord.Embed(
                 title="Resultado de la tirada",
                 description=f"Expresión: `{tirada}`",
                 color=discord.Color.green(),
             )
-            embed.add_field(
-                name="Detalle",
-                value=f"Dados: {detalle}\nTotal: **{suma}**",
-                inline=False,
-            )
+            # Las tiradas grandes y las distribuciones se calculan fuera del event loop
+            if modo == "stats":
+                distribucion = await asyncio.to_thread(distribution, expresion)
+                embed.title = "Probabilidades de la tirada"
+                embed.add_field(
+                    name="Distribución",
+                    value=self._describir_distribucion(distribucion, objetivo),
+                    inline=False,
+                )
+            else:
+                resultado = await asyncio.to_thread(roll, expresion)
+                embed.add_field(
+                    name="Detalle",
+                    value=self._describir_tirada(resultado),
+                    inline=False,
+                )
             embed.set_footer(text="Lanzador de dados D&D")
-            thumbnail_file = discord.File(ROLL_ICON, filename="thumbnail.png")
+            thumbnail_file = self.bot.assets.file(
+                "icons/dice.png", filename="thumbnail.png"
+            )
             embed.set_thumbnail(url="attachment://thumbnail.png")
 
             await interaction.followup.send(embed=embed, file=thumbnail_file)
+        except DiceError as e:
+            await interaction.followup.send(f"❌ {e}")
         except Exception as e:
             logger.error(
                 f"Error en el comando dado: {e}",
@@ -262,6 +314,44 @@ class Fun(commands.Cog, name="Diversion"):
                 "❌ Ocurrió un error al procesar la tirada."
             )
 
+    @staticmethod
+    def _describir_tirada(resultado) -> str:
+        """Dados de cada término (los descartados tachados) y el total."""
+        lineas = []
+        for tirada in resultado.rolls:
+            dados = len(tirada.kept) + len(tirada.dropped)
+            if dados <= MAX_DADOS_DETALLE:
+                valores = [str(v) for v in tirada.kept.tolist()]
+                valores += [f"~~{v}~~" for v in tirada.dropped.tolist()]
+                lineas.append(f"{tirada.term}: {' + '.join(valores)}")
+            else:
+                lineas.append(f"{tirada.term}: {abs(tirada.total)} ({dados} dados)")
+        constante = resultado.expression.constant
+        if constante:
+            lineas.append(f"Modificador: {'+' if constante > 0 else '-'} {abs(constante)}")
+        detalle = "\n".join(lineas)
+        if len(detalle) > 900:
+            detalle = detalle[:900] + "…"
+        return f"{detalle}\nTotal: **{resultado.total}**"
+
+    @staticmethod
+    def _describir_distribucion(distribucion, objetivo: int | None) -> str:
+        minimo = distribucion.minimum if distribucion.minimum is not None else "-∞"
+        maximo = distribucion.maximum if distribucion.maximum is not None else "∞"
+        lineas = [
+            f"Media: **{distribucion.mean:.2f}** (desvío {distribucion.std:.2f})",
+            f"Rango: {minimo} a {maximo}",
+            f"Más probable: {distribucion.mode} "
+            f"({distribucion.probs.max() * 100:.2f}%)",
+            f"Percentiles 5/50/95: {distribucion.percentile(0.05)} / "
+            f"{distribucion.percentile(0.5)} / {distribucion.percentile(0.95)}",
+        ]
+        if objetivo is not None:
+            lineas.append(
+                f"Probabilidad de {objetivo} o más: **{distribucion.at_least(objetivo) * 100:.2f}%**"
+            )
+        return "\n".join(lineas)
+
 
 # ==============================================================================
 # FUNCIÓN DE CARGA DEL COG
@@ -1,6 +1,5 @@
 # app/cogs/general.py
 import logging
-import os
 import random
 
 import discord
@@ -14,23 +13,6 @@ logger = logging.getLogger(__name__)
 # ==============================================================================
 # DATOS CONSTANTES
 # ==============================================================================
-CONFESSION_ICON = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-    "assets",
-    "images",
-    "icons",
-    "user.png",
-)
-
-HERESY_ICON = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-    "assets",
-    "images",
-    "icons",
-    "heresy.png",
-)
-
-
 HERESY_TEXTS = [
     "He detectado herejía. El Emperador Desaprueba.",
     "Esto suena a pensamiento herético. El Ordo Hereticus ha sido notificado.",
@@ -62,7 +44,7 @@ class ConfessionModal(ui.Modal, title="📝 Confesión Anónima"):
 
     async def on_submit(self, interaction: discord.Interaction):
         config = await self.bot.db_manager.get_guild_config(self.guild_id)
-        if not (config and (channel_id := config.get("confession_channel_id"))):
+        if not (config and (channel_id := config.confession_channel_id)):
             await interaction.response.send_message(
                 "Lo siento, el canal de confesiones no ha sido configurado.",
                 ephemeral=True,
@@ -78,7 +60,9 @@ class ConfessionModal(ui.Modal, title="📝 Confesión Anónima"):
             return
 
         try:
-            thumbnail_file = discord.File(CONFESSION_ICON, filename="thumbnail.png")
+            thumbnail_file = self.bot.assets.file(
+                "icons/user.png", filename="thumbnail.png"
+            )
             embed = discord.Embed(
                 title="Confesión Anónima",
                 description=f"{self.confession_text.value}",
@@ -146,25 +130,16 @@ class General(commands.Cog, name="General"):
         reply_to_message: discord.Message = None,
     ):
         try:
-            heresy_folder_path = "assets/images/heresy"
-            available_images = [
-                f
-                for f in os.listdir(heresy_folder_path)
-                if os.path.isfile(os.path.join(heresy_folder_path, f))
-            ]
-            if not available_images:
+            heresy_image = self.bot.assets.random_file("heresy")
+            if heresy_image is None:
                 await interaction.response.send_message(
                     "Mi armería está vacía.", ephemeral=True
                 )
                 return
 
-            random_image_name = random.choice(available_images)
             files = [
-                discord.File(
-                    os.path.join(heresy_folder_path, random_image_name),
-                    filename=random_image_name,
-                ),
-                discord.File(HERESY_ICON, filename="thumbnail.png"),
+                heresy_image,
+                self.bot.assets.file("icons/heresy.png", filename="thumbnail.png"),
             ]
 
             embed = discord.Embed(
@@ -183,7 +158,7 @@ class General(commands.Cog, name="General"):
                 inline=False,
             )
             embed.set_footer(text="El Emperador Protege.")
-            embed.set_image(url=f"attachment://{random_image_name}")
+            embed.set_image(url=f"attachment://{heresy_image.filename}")
             embed.set_thumbnail(url="attachment://thumbnail.png")
 
             if reply_to_message:
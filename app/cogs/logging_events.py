@@ -3,6 +3,8 @@ import logging
 import discord
 from discord.ext import commands
 
+from app.core.event_context import event_channel, event_guild_config
+
 logger = logging.getLogger("discord")
 
 
@@ -20,18 +22,17 @@ class LoggingEvents(commands.Cog, name="logging"):
 
     async def _send_log_embed(self, guild_id: int, embed: discord.Embed):
         """Función auxiliar para enviar un embed al canal de historia."""
-        config = await self.bot.db_manager.get_guild_config(guild_id)
+        # La configuración y el canal se comparten con los demás listeners del mismo evento
+        config = await event_guild_config(self.bot, guild_id)
 
-        if not config or not config.get("features", {}).get(
-            "history_channel_enabled", False
-        ):
+        if not config or not config.has_feature("history_channel_enabled"):
             return
 
-        if not config or not config.get("history_channel_id"):
+        if not config.history_channel_id:
             return  # Si no hay canal configurado, no hacemos nada
 
         try:
-            log_channel = self.bot.get_channel(config["history_channel_id"])
+            log_channel = event_channel(self.bot, config.history_channel_id)
             if log_channel:
                 await log_channel.send(embed=embed)
         except discord.Forbidden:
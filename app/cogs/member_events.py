@@ -1,8 +1,9 @@
 import logging
 import discord
 from discord.ext import commands
-import os
-import random
+
+from app.core.event_context import event_channel, event_guild_config
+from app.core.llm_scheduler import LLMOverloaded
 
 logger = logging.getLogger("discord")
 
@@ -26,34 +27,14 @@ class MemberEvents(commands.Cog, name="member_events"):
         recordando al usuario revisar el canal de reglas y adjuntando una imagen
         aleatoria de bienvenida desde la carpeta assets/images/welcome.
         """
-        config = await self.bot.db_manager.get_guild_config(member.guild.id)
-        if not config or not config.get("features", {}).get(
-            "welcome_message_enabled", False
-        ):
+        config = await event_guild_config(self.bot, member.guild.id)
+        if not config or not config.has_feature("welcome_message_enabled"):
             return
-        if not config or not config.get("main_channel_id"):
+        if not config.main_channel_id:
             return
 
-        channel = self.bot.get_channel(config["main_channel_id"])
-        rules_channel = self.bot.get_channel(config.get("rules_channel_id"))
-
-        # Selección aleatoria de imagen de bienvenida
-        welcome_images_path = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-            "assets",
-            "images",
-            "welcome",
-        )
-        welcome_images = [
-            f
-            for f in os.listdir(welcome_images_path)
-            if os.path.isfile(os.path.join(welcome_images_path, f))
-        ]
-        image_file = None
-        if welcome_images:
-            image_file = os.path.join(
-                welcome_images_path, random.choice(welcome_images)
-            )
+        channel = event_channel(self.bot, config.main_channel_id)
+        rules_channel = event_channel(self.bot, config.rules_channel_id)
 
         # Obtiene el cog de la IA Diami
         ai_cog = self.bot.get_cog("Inteligencia Artificial Diami")
@@ -64,27 +45,32 @@ class MemberEvents(commands.Cog, name="member_events"):
             f"Dale la bienvenida y recuérdale amablemente que lea las reglas en {reglas_mention}. "
             f"Hazlo de forma cálida y amigable."
         )
+        mensaje = None
         if ai_cog:
             # Genera el mensaje usando Diami
-            mensaje = await ai_cog._generate_gemini_response(
-                channel=channel, user_name="Diami", user_input=prompt, attachments=[]
-            )
-            # Envía el mensaje y la imagen si existe
-            if image_file:
-                with open(image_file, "rb") as img:
-                    file = discord.File(img, filename=os.path.basename(image_file))
-                    await channel.send(content=mensaje, file=file)
-            else:
-                await channel.send(content=mensaje)
-        else:
+            try:
+                mensaje = await ai_cog._generate_gemini_response(
+                    channel=channel,
+                    user_name="Diami",
+                    user_input=prompt,
+                    attachments=[],
+                    call_type="welcome",
+                    guild_id=member.guild.id,
+                )
+            except LLMOverloaded:
+                logger.warning(
+                    "Bienvenida sin IA: la cola de la IA está saturada.",
+                    extra={"guild_id": member.guild.id},
+                )
+        # Imagen de bienvenida al azar, servida desde el almacén de assets en memoria
+        file = self.bot.assets.random_file("welcome")
+        if not mensaje:
             # Fallback si la IA no está disponible
-            fallback_msg = f"¡Bienvenido {member.mention} a {member.guild.name}! 🎉 Por favor revisa el canal de reglas: {rules_channel.mention if rules_channel else ''}"
-            if image_file:
-                with open(image_file, "rb") as img:
-                    file = discord.File(img, filename=os.path.basename(image_file))
-                    await channel.send(content=fallback_msg, file=file)
-            else:
-                await channel.send(content=fallback_msg)
+            mensaje = f"¡Bienvenido {member.mention} a {member.guild.name}! 🎉 Por favor revisa el canal de reglas: {rules_channel.mention if rules_channel else ''}"
+        if file:
+            await channel.send(content=mensaje, file=file)
+        else:
+            await channel.send(content=mensaje)
 
 
 # ==============================================================================
@@ -4,6 +4,8 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
+from app.core.message_router import MessageContext
+
 logger = logging.getLogger(__name__)
 
 
@@ -14,6 +16,15 @@ class Moderation(commands.Cog, name="Moderation"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
+    async def cog_load(self):
+        """Registra el handler del canal de sugerencias en el router central."""
+        self.bot.message_router.register(
+            self.on_suggestion_message, roles=("suggestion",)
+        )
+
+    def cog_unload(self):
+        self.bot.message_router.unregister(self.on_suggestion_message)
+
     # --- Comando Slash para reportar usuarios ---
     @app_commands.command(
         name="report",
@@ -43,7 +54,7 @@ class Moderation(commands.Cog, name="Moderation"):
 
         # 2. Obtener la configuración del servidor.
         config = await self.bot.db_manager.get_guild_config(interaction.guild.id)
-        if not (config and (channel_id := config.get("report_channel_id"))):
+        if not (config and (channel_id := config.report_channel_id)):
             await interaction.response.send_message(
                 "El sistema de reportes no está configurado en este servidor. Por favor, contacta a un administrador.",
                 ephemeral=True,
@@ -124,20 +135,9 @@ class Moderation(commands.Cog, name="Moderation"):
             )
 
     # --- Sistema de Sugerencias y Reclamos---
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot or not message.guild:
-            return
-
-        # Verifica si el canal de sugerencias/reclamos está configurado
-        config = await self.bot.db_manager.get_guild_config(message.guild.id)
-        if not config or not config.get("suggestion_channel_id"):
-            return
-
-        # Verifica si el mensaje se envia en el canal de sugerencias
-        suggestion_channel_id = config["suggestion_channel_id"]
-        if message.channel.id != suggestion_channel_id:
-            return
+    async def on_suggestion_message(self, context: MessageContext):
+        """Handler del router para los mensajes del canal de sugerencias."""
+        message = context.message
 
         # Verifica si el mensaje es una sugerencia o un reclamo de lo contrario lo borramos
         if not message.content.startswith("Sugerencia:") or message.content.startswith(
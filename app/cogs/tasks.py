@@ -59,27 +59,28 @@ class ScheduledTasks(commands.Cog, name="tasks"):
 
         logger.info("¡Es Jueves! Preparando el envío del meme.")
 
+        # Obtenemos todas las configuraciones en una sola consulta
+        configs = await self.bot.db_manager.get_guild_configs(
+            guild.id for guild in self.bot.guilds
+        )
+
         # Buscamos en todos los servidores el canal principal para enviar el meme
         for guild in self.bot.guilds:
             try:
-                # Accedemos al db_manager a través del bot
-                config = await self.bot.db_manager.get_guild_config(guild.id)
-                if not config or not config.get("main_channel_id"):
+                config = configs.get(guild.id)
+                if not config or not config.main_channel_id:
                     # Si no hay configuración o el canal principal no está definido, saltamos al siguiente servidor
                     continue
-                if not config.get("features", {}).get(
-                    "feliz_jueves_task_enabled", False
-                ):
+                if not config.has_feature("feliz_jueves_task_enabled"):
                     # Si la tarea no está habilitada, saltamos al siguiente servidor
                     continue
 
-                channel_id = config.get("main_channel_id")
-                channel = guild.get_channel(channel_id)
+                channel = guild.get_channel(config.main_channel_id)
 
                 if channel and isinstance(channel, discord.TextChannel):
-                    image_path = "assets/images/feliz-jueves.png"
                     try:
-                        file = discord.File(image_path, filename="feliz-jueves.png")
+                        # Los bytes se leen una vez; cada servidor recibe su propio BytesIO
+                        file = self.bot.assets.file("feliz-jueves.png")
                         # Elegir un mensaje aleatorio de la lista
                         message_text = random.choice(MENSAJES_JUEVES)
 
@@ -91,7 +92,7 @@ class ScheduledTasks(commands.Cog, name="tasks"):
 
                     except FileNotFoundError:
                         logger.error(
-                            f"No se encontró el archivo del meme 'feliz_jueves.png' en la ruta: {image_path}",
+                            f"No se encontró el archivo del meme 'feliz-jueves.png' en {self.bot.assets.root}",
                             extra={"guild_id": guild.id},
                         )
                     except Exception as e:
@@ -0,0 +1,121 @@
+# app/core/assets.py
+import logging
+import os
+import random
+from io import BytesIO
+from typing import Optional
+
+import discord
+
+logger = logging.getLogger("discord")
+
+# ==============================================================================
+# Parámetros del almacén de assets
+# ==============================================================================
+ASSETS_ROOT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    "assets",
+    "images",
+)
+# Los archivos más grandes no se guardan en memoria: se leen del disco en cada envío
+DEFAULT_MAX_RESIDENT_BYTES = 4 * 1024 * 1024
+
+
+class _Folder:
+    __slots__ = ("mtime", "names", "data")
+
+    def __init__(self, mtime: Optional[int], names: tuple):
+        self.mtime = mtime
+        self.names = names
+        self.data: dict[str, bytes] = {}
+
+
+# ==============================================================================
+# Almacén de assets
+# ==============================================================================
+class AssetStore:
+    """
+    Índice en memoria de las carpetas de `assets/images`. Cada carpeta se lista una sola
+    vez y sus archivos se leen del disco la primera vez que se piden; los que no superan
+    `max_resident_bytes` quedan en memoria. Cada envío recibe un `discord.File` nuevo sobre
+    un `BytesIO` propio, así los bytes compartidos nunca se consumen.
+
+    Si cambia el mtime de una carpeta (se agregó, quitó o renombró un archivo), se vuelve a
+    indexar y se descartan los bytes memorizados de esa carpeta.
+    """
+
+    def __init__(
+        self,
+        root: str = ASSETS_ROOT,
+        max_resident_bytes: int = DEFAULT_MAX_RESIDENT_BYTES,
+    ):
+        self.root = root
+        self.max_resident_bytes = max_resident_bytes
+        self._folders: dict[str, _Folder] = {}
+
+    def _folder(self, folder: str) -> _Folder:
+        """Índice de la carpeta, reconstruido si su mtime cambió desde la última vez."""
+        path = os.path.join(self.root, folder)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        entry = self._folders.get(folder)
+        if entry is not None and entry.mtime == mtime:
+            return entry
+
+        names = ()
+        if mtime is not None:
+            try:
+                names = tuple(
+                    sorted(
+                        f
+                        for f in os.listdir(path)
+                        if os.path.isfile(os.path.join(path, f))
+                    )
+                )
+            except OSError as e:
+                logger.warning(f"No se pudo indexar la carpeta de assets '{path}': {e}")
+        if entry is not None:
+            logger.info(f"Carpeta de assets '{folder or '.'}' modificada, se re-indexa.")
+        entry = _Folder(mtime, names)
+        self._folders[folder] = entry
+        return entry
+
+    def names(self, folder: str) -> tuple:
+        """Nombres de los archivos de una carpeta (relativa a `root`)."""
+        return self._folder(folder).names
+
+    def read(self, path: str) -> bytes:
+        """
+        Bytes de un asset (ruta relativa a `root`, p. ej. 'icons/dice.png').
+
+        Raises:
+            FileNotFoundError: Si el archivo no está en el índice de su carpeta.
+        """
+        folder, name = os.path.split(path)
+        entry = self._folder(folder)
+        data = entry.data.get(name)
+        if data is not None:
+            return data
+        if name not in entry.names:
+            raise FileNotFoundError(os.path.join(self.root, path))
+
+        with open(os.path.join(self.root, path), "rb") as file:
+            data = file.read()
+        if len(data) <= self.max_resident_bytes:
+            entry.data[name] = data
+        return data
+
+    def file(self, path: str, filename: Optional[str] = None) -> discord.File:
+        """`discord.File` nuevo para un asset; `filename` es el nombre con que se adjunta."""
+        data = self.read(path)
+        return discord.File(BytesIO(data), filename=filename or os.path.basename(path))
+
+    def random_file(self, folder: str) -> Optional[discord.File]:
+        """Un archivo al azar de la carpeta, o None si está vacía."""
+        names = self.names(folder)
+        if not names:
+            return None
+        return self.file(os.path.join(folder, random.choice(names)))
@@ -0,0 +1,101 @@
+# app/core/attachments.py
+import asyncio
+import logging
+from collections import OrderedDict
+from io import BytesIO
+from typing import Optional
+
+import discord
+from PIL import Image
+
+logger = logging.getLogger("discord")
+
+# ==============================================================================
+# Límites del preprocesado de imágenes
+# ==============================================================================
+MAX_ATTACHMENT_BYTES = 10 * 1024 * 1024  # No se descargan adjuntos más grandes
+MAX_IMAGE_EDGE = 1024  # Lado mayor de la imagen enviada al modelo
+JPEG_QUALITY = 85
+IMAGE_CACHE_SIZE = 64  # Imágenes preprocesadas memorizadas (por ID de adjunto)
+
+
+def _downscale(data: bytes, max_edge: int, quality: int) -> bytes:
+    """Decodifica, reduce al lado máximo y re-codifica como JPEG. Corre fuera del event loop."""
+    with Image.open(BytesIO(data)) as image:
+        # En JPEG, draft decodifica directamente a una escala reducida
+        image.draft("RGB", (max_edge, max_edge))
+        image.thumbnail((max_edge, max_edge))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+# ==============================================================================
+# Pipeline de adjuntos para prompts multimodales
+# ==============================================================================
+class AttachmentPipeline:
+    """
+    Prepara las imágenes adjuntas para el modelo: descarga en paralelo (con tope de tamaño),
+    descarta lo que no es imagen según su content type, y decodifica, reduce y re-codifica
+    en un hilo. El resultado es un blob JPEG (`{"mime_type", "data"}`) memorizado por ID
+    de adjunto, así una misma imagen citada varias veces se procesa una sola vez.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = MAX_ATTACHMENT_BYTES,
+        max_edge: int = MAX_IMAGE_EDGE,
+        quality: int = JPEG_QUALITY,
+        cache_size: int = IMAGE_CACHE_SIZE,
+    ):
+        self.max_bytes = max_bytes
+        self.max_edge = max_edge
+        self.quality = quality
+        self.cache_size = cache_size
+        self._cache: OrderedDict[int, dict] = OrderedDict()
+        self._inflight: dict[int, asyncio.Future] = {}  # Adjuntos procesándose ahora
+
+    @staticmethod
+    def is_image(attachment: discord.Attachment) -> bool:
+        return (attachment.content_type or "").startswith("image/")
+
+    async def prepare(self, attachments: list) -> list[dict]:
+        """Retorna los blobs de las imágenes válidas, en el orden de los adjuntos."""
+        results = await asyncio.gather(*(self._prepare(a) for a in attachments))
+        return [blob for blob in results if blob is not None]
+
+    async def _prepare(self, attachment: discord.Attachment) -> Optional[dict]:
+        blob = self._cache.get(attachment.id)
+        if blob is not None:
+            self._cache.move_to_end(attachment.id)
+            return blob
+
+        future = self._inflight.get(attachment.id)
+        if future is None:
+            future = asyncio.ensure_future(self._process(attachment))
+            self._inflight[attachment.id] = future
+            future.add_done_callback(lambda _: self._inflight.pop(attachment.id, None))
+        return await asyncio.shield(future)
+
+    async def _process(self, attachment: discord.Attachment) -> Optional[dict]:
+        if not self.is_image(attachment):
+            return None
+        if attachment.size > self.max_bytes:
+            logger.info(
+                f"Adjunto '{attachment.filename}' omitido: {attachment.size} bytes supera el límite."
+            )
+            return None
+        try:
+            data = await attachment.read()
+            encoded = await asyncio.to_thread(_downscale, data, self.max_edge, self.quality)
+        except Exception as e:
+            logger.warning(f"No se pudo procesar el adjunto '{attachment.filename}': {e}")
+            return None
+
+        blob = {"mime_type": "image/jpeg", "data": encoded}
+        self._cache[attachment.id] = blob
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return blob
@@ -0,0 +1,129 @@
+# app/core/cache.py
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from ..schemas.guild_config import GuildConfig
+
+# Valor centinela para distinguir "no está en caché" de "la configuración no existe".
+MISSING = object()
+
+
+def apply_fields(guild_id: int, config: Optional[dict], fields: dict) -> dict:
+    """
+    Aplica un `$set` (claves en notación de punto) sobre un documento de configuración,
+    creándolo si no existe, tal como lo haría un `update_one(..., upsert=True)`.
+    """
+    if config is None:
+        config = {"_id": guild_id}
+    for key, value in fields.items():
+        target = config
+        *parents, leaf = key.split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = value
+    return config
+
+
+# ==============================================================================
+# Caché en memoria para configuraciones de servidores
+# ==============================================================================
+class GuildConfigCache:
+    """
+    Caché LRU con tiempo de vida (TTL) para las configuraciones (`GuildConfig`) de los guilds.
+    También almacena resultados negativos (guilds sin configuración) para evitar
+    consultar la base de datos una y otra vez por documentos que no existen.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 300.0,
+        on_evict: Optional[Callable[[int], None]] = None,
+    ):
+        """
+        Args:
+            max_size (int): Cantidad máxima de guilds que se mantienen en memoria.
+            ttl (float): Segundos que una entrada se considera válida.
+            on_evict (Callable, opcional): Se llama con el guild_id de cada entrada que sale
+                de la caché (por TTL, desalojo LRU o invalidación).
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._entries: OrderedDict[int, tuple[float, Optional[GuildConfig]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, guild_id: int) -> bool:
+        entry = self._entries.get(guild_id)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def get(self, guild_id: int) -> Any:
+        """
+        Retorna la configuración cacheada (que puede ser None si el guild no tiene
+        documento) o MISSING si no hay una entrada válida.
+        """
+        entry = self._entries.get(guild_id)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        expires_at, config = entry
+        if expires_at <= time.monotonic():
+            self.invalidate(guild_id)
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(guild_id)
+        self.hits += 1
+        return config
+
+    def set(self, guild_id: int, config: Optional[GuildConfig]):
+        """Guarda (o reemplaza) la configuración de un guild y aplica el desalojo LRU."""
+        self._entries[guild_id] = (time.monotonic() + self.ttl, config)
+        self._entries.move_to_end(guild_id)
+        while len(self._entries) > self.max_size:
+            evicted, _ = self._entries.popitem(last=False)
+            self._evicted(evicted)
+
+    def update_fields(self, guild_id: int, fields: dict):
+        """
+        Aplica un `$set` (con claves en notación de punto) sobre la entrada cacheada,
+        replicando la semántica de `update_one(..., upsert=True)` de MongoDB.
+        Si el guild no está en caché no hace nada: la próxima lectura irá a la base de datos.
+        """
+        entry = self._entries.get(guild_id)
+        if entry is None:
+            return
+        expires_at, config = entry
+        if config is None:
+            config = GuildConfig(guild_id)
+            self._entries[guild_id] = (expires_at, config)
+        config.apply_fields(fields)
+
+    def invalidate(self, guild_id: int):
+        """Elimina la entrada de un guild, si existe."""
+        if self._entries.pop(guild_id, None) is not None:
+            self._evicted(guild_id)
+
+    def clear(self):
+        """Vacía la caché por completo."""
+        for guild_id in list(self._entries):
+            self.invalidate(guild_id)
+
+    def _evicted(self, guild_id: int):
+        if self.on_evict is not None:
+            self.on_evict(guild_id)
+
+    def stats(self) -> dict:
+        """Retorna los contadores de aciertos y fallos junto con el tamaño actual."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
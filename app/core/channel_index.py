@@ -0,0 +1,98 @@
+# app/core/channel_index.py
+from typing import Callable, Optional
+
+from ..schemas.guild_config import CHANNEL_ROLES, GuildConfig
+
+NO_ROLES = frozenset()
+
+
+def config_channel_roles(config: Optional[GuildConfig], channel_id: int) -> frozenset:
+    """Calcula los roles de un canal directamente desde una configuración."""
+    if config is None:
+        return NO_ROLES
+    return frozenset(
+        role for field, role in CHANNEL_ROLES.items() if getattr(config, field) == channel_id
+    )
+
+
+# ==============================================================================
+# Índice inverso canal -> rol
+# ==============================================================================
+class ChannelIndex:
+    """
+    Índice en memoria que resuelve qué rol(es) cumple un canal (principal, sugerencias,
+    confesiones, etc.) sin leer la configuración del guild.
+    Permite descartar con una sola búsqueda en un diccionario, y sin await, los mensajes
+    de canales que no le interesan al bot.
+    """
+
+    def __init__(self):
+        self._roles: dict[int, frozenset] = {}
+        # guild_id -> {rol: channel_id}, para poder deshacer el índice de un guild
+        self._guilds: dict[int, dict[str, int]] = {}
+        # Se llaman con (guild_id, {rol: channel_id}) cada vez que se indexa un guild
+        self._listeners: list[Callable[[int, dict], None]] = []
+
+    def subscribe(self, listener: Callable[[int, dict], None]):
+        """Registra una función que recibe los canales de cada guild que se (re)indexa."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[int, dict], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def knows_guild(self, guild_id: int) -> bool:
+        """Indica si la configuración del guild ya fue indexada."""
+        return guild_id in self._guilds
+
+    def roles(self, channel_id: int) -> frozenset:
+        """Retorna los roles del canal (vacío si el canal no está configurado)."""
+        return self._roles.get(channel_id, NO_ROLES)
+
+    def index(self, guild_id: int, config: Optional[GuildConfig]):
+        """(Re)indexa todos los canales de un guild a partir de su configuración."""
+        channels = {}
+        if config is not None:
+            for field, role in CHANNEL_ROLES.items():
+                channel_id = getattr(config, field)
+                if channel_id:
+                    channels[role] = channel_id
+        self._replace(guild_id, channels)
+        self._notify(guild_id, channels)
+
+    def update_channel(self, guild_id: int, field: str, channel_id: Optional[int]):
+        """Actualiza un solo canal. Si el guild no está indexado, no hace nada."""
+        role = CHANNEL_ROLES.get(field)
+        if role is None or guild_id not in self._guilds:
+            return
+        channels = dict(self._guilds[guild_id])
+        if channel_id:
+            channels[role] = channel_id
+        else:
+            channels.pop(role, None)
+        self._replace(guild_id, channels)
+        self._notify(guild_id, channels)
+
+    def remove_guild(self, guild_id: int):
+        """Elimina un guild del índice."""
+        self._replace(guild_id, None)
+
+    def _notify(self, guild_id: int, channels: dict):
+        for listener in list(self._listeners):
+            listener(guild_id, channels)
+
+    def _replace(self, guild_id: int, channels: Optional[dict]):
+        previous = self._guilds.pop(guild_id, {})
+        affected = set(previous.values())
+        if channels is not None:
+            self._guilds[guild_id] = channels
+            affected.update(channels.values())
+        # Los IDs de canal son únicos en Discord: un canal pertenece a un solo guild.
+        for channel_id in affected:
+            roles = frozenset(
+                role for role, cid in (channels or {}).items() if cid == channel_id
+            )
+            if roles:
+                self._roles[channel_id] = roles
+            else:
+                self._roles.pop(channel_id, None)
@@ -0,0 +1,142 @@
+# app/core/context_cache.py
+import asyncio
+import datetime
+import logging
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger("discord")
+
+# ==============================================================================
+# Parámetros del caché de contexto
+# ==============================================================================
+DEFAULT_CACHE_TTL = 3600.0  # Segundos de vida del contenido cacheado en Gemini
+REFRESH_MARGIN = 300.0  # Se renueva cuando faltan menos de estos segundos para expirar
+RETRY_AFTER = 600.0  # Espera tras un fallo antes de volver a intentar crear el caché
+
+
+def _default_create(model_name: str, contents: list, ttl: float):
+    from google.generativeai import caching
+
+    return caching.CachedContent.create(
+        model=model_name,
+        contents=contents,
+        ttl=datetime.timedelta(seconds=ttl),
+    )
+
+
+def _default_model_factory(cached_content, generation_config, safety_settings):
+    import google.generativeai as genai
+
+    return genai.GenerativeModel.from_cached_content(
+        cached_content=cached_content,
+        generation_config=generation_config,
+        safety_settings=safety_settings,
+    )
+
+
+# ==============================================================================
+# Prefijo estático cacheado en Gemini
+# ==============================================================================
+class CachedPrefix:
+    """
+    Mantiene un `CachedContent` de Gemini con un prefijo estático del prompt (el texto de
+    personalidad) y el modelo asociado. Las llamadas usan `model()`: si el caché está vigente
+    retorna el modelo cacheado y el prefijo no se vuelve a enviar; si no (todavía creándose,
+    expirado o no disponible) retorna None y el llamador envía el prefijo inline.
+
+    La creación y la renovación del TTL corren en segundo plano (son llamadas HTTP
+    bloqueantes del SDK) y se disparan antes de que el caché expire. `create` y
+    `model_factory` son inyectables para poder probarlo sin la API.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        prefix: str,
+        generation_config=None,
+        safety_settings=None,
+        ttl: float = DEFAULT_CACHE_TTL,
+        refresh_margin: float = REFRESH_MARGIN,
+        create: Optional[Callable] = None,
+        model_factory: Optional[Callable] = None,
+    ):
+        self.model_name = model_name
+        self.prefix = prefix
+        self.generation_config = generation_config
+        self.safety_settings = safety_settings
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl / 2)
+        self._create = create or _default_create
+        self._model_factory = model_factory or _default_model_factory
+
+        self._cached_content = None
+        self._model = None
+        self._expires_at = 0.0  # time.monotonic() en que expira el caché actual
+        self._retry_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def model(self):
+        """Modelo con el prefijo cacheado, o None si hay que enviarlo inline."""
+        now = time.monotonic()
+        if now >= self._expires_at - self.refresh_margin:
+            self._schedule_refresh(now)
+        return self._model if now < self._expires_at else None
+
+    def start(self):
+        """Crea el caché en segundo plano (las llamadas previas usan el prompt inline)."""
+        self._schedule_refresh(time.monotonic())
+
+    def _schedule_refresh(self, now: float):
+        if self._closed or now < self._retry_at:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._refresh())
+
+    async def _refresh(self):
+        """Extiende el TTL del caché vigente o, si no hay o falla, crea uno nuevo."""
+        try:
+            if self._cached_content is not None and time.monotonic() < self._expires_at:
+                try:
+                    await asyncio.to_thread(
+                        self._cached_content.update,
+                        ttl=datetime.timedelta(seconds=self.ttl),
+                    )
+                    self._expires_at = time.monotonic() + self.ttl
+                    return
+                except Exception as e:
+                    logger.warning(f"No se pudo renovar el caché de contexto: {e}")
+
+            cached_content = await asyncio.to_thread(
+                self._create, self.model_name, [self.prefix], self.ttl
+            )
+            self._model = self._model_factory(
+                cached_content, self.generation_config, self.safety_settings
+            )
+            self._cached_content = cached_content
+            self._expires_at = time.monotonic() + self.ttl
+            logger.info(
+                f"Caché de contexto creado para {self.model_name} "
+                f"({getattr(cached_content, 'name', '?')})."
+            )
+        except Exception as e:
+            # Sin caché (modelo no compatible, prompt corto, cuota...): se sigue inline
+            self._retry_at = time.monotonic() + RETRY_AFTER
+            logger.warning(
+                f"Caché de contexto no disponible, se envía el prompt inline: {e}"
+            )
+
+    async def close(self):
+        """Cancela la renovación pendiente y elimina el caché en Gemini."""
+        self._closed = True
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        cached_content, self._cached_content, self._model = self._cached_content, None, None
+        self._expires_at = 0.0
+        if cached_content is not None and hasattr(cached_content, "delete"):
+            try:
+                await asyncio.to_thread(cached_content.delete)
+            except Exception as e:
+                logger.warning(f"No se pudo eliminar el caché de contexto: {e}")
@@ -1,41 +1,236 @@
 # app/core/database.py
+import asyncio
 import logging
-import motor.motor_asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
-from ..schemas.guild_config import get_default_guild_config
+from .cache import MISSING, GuildConfigCache, apply_fields
+from .channel_index import ChannelIndex
+from .metrics import CommandLatencyListener, PoolMetricsListener
+from .storage import SQLITE_DEFAULT_PATH, StorageBackend, create_backend
+from ..schemas.guild_config import GuildConfig, get_default_guild_config
 
 logger = logging.getLogger("discord")
 
+# ==============================================================================
+# Parámetros por defecto de la caché de configuraciones
+# ==============================================================================
+CONFIG_CACHE_TTL = 300.0  # Segundos que una configuración cacheada se considera válida
+CONFIG_CACHE_MAX_SIZE = 1024  # Cantidad máxima de guilds en memoria
+WRITE_BEHIND_FLUSH_INTERVAL = 2.0  # Segundos entre volcados de la cola de escrituras
+CHANGE_POLL_INTERVAL = 30.0  # Segundos entre consultas de `updated_at` si no hay change streams
+LOGGED_MONGO_COMMANDS = 8  # Comandos de MongoDB (los más frecuentes) que se registran al cerrar
+
 
 class DatabaseManager:
-    def __init__(self, mongo_uri: str):
+    def __init__(
+        self,
+        mongo_uri: Optional[str] = None,
+        cache_ttl: float = CONFIG_CACHE_TTL,
+        cache_max_size: int = CONFIG_CACHE_MAX_SIZE,
+        write_behind: bool = False,
+        flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+        storage_backend: str = "mongo",
+        sqlite_path: str = SQLITE_DEFAULT_PATH,
+        backend: Optional[StorageBackend] = None,
+        watch_changes: bool = False,
+        poll_interval: float = CHANGE_POLL_INTERVAL,
+        mongo_options: Optional[dict] = None,
+    ):
+        """
+        Args:
+            mongo_uri (str, opcional): URI de MongoDB, requerida con el backend 'mongo'.
+            storage_backend (str): 'mongo', 'memory' o 'sqlite'. Se ignora si se pasa `backend`.
+            sqlite_path (str): Archivo de la base de datos para el backend 'sqlite'.
+            backend (StorageBackend, opcional): Instancia de backend ya construida.
+            watch_changes (bool): Si es True, `start_change_watcher` mantiene la caché
+                sincronizada con los cambios hechos por otros procesos.
+            poll_interval (float): Intervalo de polling cuando no hay change streams.
+            mongo_options (dict, opcional): Opciones del cliente de MongoDB
+                (maxPoolSize, waitQueueTimeoutMS, serverSelectionTimeoutMS, ...).
+        """
+        # Índice inverso canal -> rol, alimentado por cada configuración que se carga o actualiza.
+        # Vive lo mismo que la entrada de la caché: se deshace cuando el guild sale de ella.
+        self.channel_index = ChannelIndex()
+        self.cache = GuildConfigCache(
+            max_size=cache_max_size,
+            ttl=cache_ttl,
+            on_evict=self.channel_index.remove_guild,
+        )
+        # Consultas en curso por guild (single-flight): las lecturas concurrentes comparten una sola
+        self._inflight: dict[int, asyncio.Task] = {}
+        # Generación de escritura por guild: cambia antes y después de cada escritura, así una
+        # lectura que se solapó con una escritura sabe que su resultado puede estar desactualizado
+        self._write_generation: dict[int, int] = {}
+
+        # Write-behind: los `$set` pendientes se agrupan por guild y se vuelcan con un bulk_write
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self._pending: dict[int, dict] = {}
+        self._flushing: dict[int, dict] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+
+        # Invalidación entre procesos (change streams o polling de `updated_at`)
+        self.watch_changes = watch_changes
+        self.poll_interval = poll_interval
+        self._watch_task = None
+
+        # Instrumentación de MongoDB: latencia por comando y métricas del pool de conexiones
+        self.command_metrics = CommandLatencyListener()
+        self.pool_metrics = PoolMetricsListener()
+        mongo_options = {
+            **(mongo_options or {}),
+            "event_listeners": [self.command_metrics, self.pool_metrics],
+        }
+        try:
+            self.backend = backend or create_backend(
+                storage_backend,
+                mongo_uri=mongo_uri,
+                sqlite_path=sqlite_path,
+                mongo_options=mongo_options,
+            )
+            logger.info(
+                f"Backend de almacenamiento '{self.backend.name}' inicializado exitosamente."
+            )
+        except Exception as e:
+            logger.critical(f"No se pudo inicializar el backend de almacenamiento: {e}")
+            self.backend = None
+
+    async def get_guild_config(self, guild_id: int) -> Optional[GuildConfig]:
+        """
+        Obtiene la configuración de un servidor específico por su ID.
+        Primero consulta la caché en memoria y solo va al backend si no hay una entrada válida.
+        El objeto retornado es compartido con la caché: no debe modificarse.
+        """
+        config = self.cache.get(guild_id)
+        if config is not MISSING:
+            return config
+
+        # Si ya hay una consulta en curso para este guild, nos "colgamos" de ella.
+        task = self._inflight.get(guild_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch_guild_config(guild_id))
+            self._inflight[guild_id] = task
+            task.add_done_callback(lambda t: self._forget_inflight(guild_id, t))
+        # shield evita que la cancelación de un solo llamador cancele la consulta compartida
+        return await asyncio.shield(task)
+
+    async def _fetch_guild_config(self, guild_id: int):
+        """Consulta el backend y guarda el resultado en la caché."""
+        generation = self._generation(guild_id)
+        document = await self.backend.get(guild_id)
+        config = GuildConfig.from_document(self._apply_pending(guild_id, document))
+        # Si hubo una escritura mientras la consulta estaba en curso, el resultado puede
+        # estar desactualizado: solo se cachea si la generación no cambió.
+        if self._generation(guild_id) == generation:
+            self._store(guild_id, config)
+        return config
+
+    def _forget_inflight(self, guild_id: int, task: asyncio.Task):
+        if self._inflight.get(guild_id) is task:
+            del self._inflight[guild_id]
+
+    def _generation(self, guild_id: int) -> int:
+        return self._write_generation.get(guild_id, 0)
+
+    def _begin_write(self, guild_id: int):
+        """Marca el inicio o el fin de una escritura sobre la configuración de un guild."""
+        self._write_generation[guild_id] = self._generation(guild_id) + 1
+
+    async def get_guild_configs(self, guild_ids) -> dict:
+        """
+        Obtiene la configuración de varios servidores con una sola consulta
+        (un `$in` en MongoDB).
+        Los guilds presentes en la caché no se consultan; los que no tienen documento
+        se retornan como None (y se cachean como tal).
+
+        Args:
+            guild_ids (Iterable[int]): IDs de los servidores.
+
+        Returns:
+            dict: Mapeo guild_id -> GuildConfig (o None).
+        """
+        configs = {}
+        missing = []
+        for guild_id in dict.fromkeys(guild_ids):
+            config = self.cache.get(guild_id)
+            if config is MISSING:
+                missing.append(guild_id)
+            else:
+                configs[guild_id] = config
+
+        if missing:
+            generations = {guild_id: self._generation(guild_id) for guild_id in missing}
+            fetched = await self.backend.get_many(missing)
+            for guild_id in missing:
+                document = self._apply_pending(guild_id, fetched.get(guild_id))
+                config = GuildConfig.from_document(document)
+                # No pisamos la caché si hubo una escritura o lectura individual en el medio
+                if (
+                    self._generation(guild_id) == generations[guild_id]
+                    and guild_id not in self._inflight
+                    and guild_id not in self.cache
+                ):
+                    self._store(guild_id, config)
+                configs[guild_id] = config
+        return configs
+
+    async def warm_guild_configs(self, guild_ids):
+        """Precarga en la caché la configuración de todos los guilds indicados."""
         try:
-            self.client = motor.motor_asyncio.AsyncIOMotorClient(mongo_uri)
-            self.db = self.client["DiamiBotDB"]
-            self.collection = self.db["guild_configs"]
-            logger.info("Conexión con MongoDB establecida exitosamente.")
+            configs = await self.get_guild_configs(guild_ids)
+            logger.info(f"Caché de configuraciones precargada con {len(configs)} guilds.")
         except Exception as e:
-            logger.critical(f"No se pudo conectar a MongoDB: {e}")
-            self.client = None
+            logger.error(f"Error al precargar las configuraciones de los guilds: {e}")
+
+    def _store(self, guild_id: int, config: Optional[GuildConfig]):
+        """Guarda una configuración en la caché y reindexa sus canales."""
+        self.cache.set(guild_id, config)
+        self.channel_index.index(guild_id, config)
 
-    async def get_guild_config(self, guild_id: int):
-        """Obtiene la configuración de un servidor específico por su ID."""
-        return await self.collection.find_one({"_id": guild_id})
+    def channel_roles(self, guild_id: int, channel_id: int) -> Optional[frozenset]:
+        """
+        Retorna los roles que cumple un canal ('main', 'suggestion', etc.) sin acceder
+        a la base de datos. Retorna None si la configuración del guild no está cargada o su
+        entrada de caché expiró, en cuyo caso el llamador debe recurrir a `get_guild_config`.
+        """
+        if guild_id not in self.cache or not self.channel_index.knows_guild(guild_id):
+            return None
+        return self.channel_index.roles(channel_id)
+
+    def cache_stats(self) -> dict:
+        """Retorna las estadísticas de aciertos/fallos de la caché de configuraciones."""
+        return self.cache.stats()
+
+    def mongo_metrics(self) -> dict:
+        """
+        Retorna los histogramas de latencia por comando ('operación:colección') y las
+        métricas del pool de conexiones (conexiones abiertas, en uso y espera de checkout).
+        """
+        return {
+            "commands": self.command_metrics.snapshot(),
+            "pool": self.pool_metrics.snapshot(),
+        }
+
+    def forget_guild(self, guild_id: int):
+        """Descarta de la memoria la configuración y los canales indexados de un guild."""
+        self._inflight.pop(guild_id, None)
+        self.cache.invalidate(guild_id)
+        self.channel_index.remove_guild(guild_id)
 
     async def create_guild_config(self, guild_id: int):
         """
         Crea un documento de configuración por defecto para un nuevo servidor.
         Se ejecuta cuando el bot se une a un nuevo guild.
         """
-        if await self.get_guild_config(guild_id):
+        _, created = await self._upsert_default_config(guild_id)
+        if not created:
             logger.info(
                 f"La configuración para el Guild {guild_id} ya existe. No se creará una nueva."
             )
             return False
 
-        default_config = get_default_guild_config(guild_id)
-
-        await self.collection.insert_one(default_config)
         logger.info(f"Se ha creado la configuración inicial para el Guild {guild_id}.")
         return True  # Retornamos True para indicar que se creó una nueva configuración
 
@@ -44,15 +239,39 @@ class DatabaseManager:
         Verifica si el documento de configuración del servidor existe en la base de datos.
         Si no existe, lo crea con los valores por defecto.
         """
-        config = await self.get_guild_config(guild_id)
-        if not config:
-            await self.create_guild_config(guild_id)
+        config, created = await self._upsert_default_config(guild_id)
+        if created:
             logger.info(
                 f"Configuración creada automáticamente para el Guild {guild_id}."
             )
         else:
             logger.info(f"Configuración ya existe para el Guild {guild_id}.")
-        return await self.get_guild_config(guild_id)
+        return config
+
+    async def _upsert_default_config(self, guild_id: int) -> tuple[GuildConfig, bool]:
+        """
+        Crea-u-obtiene la configuración de un guild en un solo round trip atómico
+        (en MongoDB, `find_one_and_update` con `$setOnInsert` de los valores por defecto).
+
+        Returns:
+            tuple[GuildConfig, bool]: La configuración vigente y si fue creada en esta llamada.
+        """
+        config = self.cache.get(guild_id)
+        if config is not MISSING and config is not None:
+            return config, False
+
+        default_config = get_default_guild_config(guild_id)
+        self._begin_write(guild_id)
+        previous = await self.backend.insert_if_missing(guild_id, default_config)
+        self._begin_write(guild_id)
+
+        created = previous is None
+        config = GuildConfig.from_document(
+            self._apply_pending(guild_id, default_config if created else previous)
+        )
+        self._inflight.pop(guild_id, None)
+        self._store(guild_id, config)
+        return config, created
 
     async def update_channel(self, guild_id: int, channel_type: str, channel_id: int):
         """
@@ -63,11 +282,8 @@ class DatabaseManager:
         logger.info(
             f"Actualizando canal {channel_type} para el Guild {guild_id} con ID {channel_id}."
         )
-        await self.collection.update_one(
-            {"_id": guild_id},
-            {"$set": {channel_type: channel_id}},
-            upsert=True,  # Si el documento no existe, se creará con esta actualización
-        )
+        await self._set_fields(guild_id, {channel_type: channel_id})
+        self.channel_index.update_channel(guild_id, channel_type, channel_id)
 
     async def update_feature_flag(self, guild_id: int, feature_name: str, status: bool):
         """
@@ -81,9 +297,176 @@ class DatabaseManager:
         # Usamos la notación de punto para actualizar un campo en un documento anidado.
         update_key = f"features.{feature_name}"
 
-        await self.collection.update_one(
-            {"_id": guild_id},
-            {"$set": {update_key: status}},
-            upsert=True,  # Si el documento no existe, se creará con esta actualización
-        )
+        if self.write_behind:
+            self._enqueue_write(guild_id, {update_key: status})
+        else:
+            self._begin_write(guild_id)
+            await self.backend.set_feature_flag(guild_id, feature_name, status)
+            self._begin_write(guild_id)
+            self.cache.update_fields(guild_id, {update_key: status})
+        # Las lecturas posteriores no deben colgarse de una consulta previa a la escritura
+        self._inflight.pop(guild_id, None)
         logger.info(f"Guild {guild_id}: Flag '{feature_name}' establecido a {status}.")
+
+    async def _set_fields(self, guild_id: int, fields: dict):
+        """
+        Aplica un `$set` sobre la configuración de un guild.
+        Con write-behind activo, el cambio queda en la cola en memoria y se vuelca más tarde;
+        en ambos casos la caché se actualiza (write-through) para que las lecturas lo vean.
+        """
+        if self.write_behind:
+            self._enqueue_write(guild_id, fields)
+        else:
+            self._begin_write(guild_id)
+            await self.backend.upsert_fields(guild_id, fields)
+            self._begin_write(guild_id)
+            # Write-through: la caché refleja el cambio sin tener que releer el documento
+            self.cache.update_fields(guild_id, fields)
+        # Las lecturas posteriores no deben colgarse de una consulta previa a la escritura
+        self._inflight.pop(guild_id, None)
+
+    def _enqueue_write(self, guild_id: int, fields: dict):
+        """Encola un `$set` para el próximo volcado y lo refleja en la caché."""
+        self._begin_write(guild_id)
+        self._pending.setdefault(guild_id, {}).update(fields)
+        self.cache.update_fields(guild_id, fields)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def _apply_pending(self, guild_id: int, config):
+        """Superpone sobre un documento leído de la base de datos los cambios aún no volcados."""
+        for queue in (self._flushing, self._pending):
+            if guild_id in queue:
+                config = apply_fields(guild_id, config, queue[guild_id])
+        return config
+
+    async def _flush_loop(self):
+        """Tarea en segundo plano que vuelca periódicamente la cola de escrituras."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error en el volcado de escrituras pendientes: {e}")
+
+    async def flush(self):
+        """
+        Vuelca todas las escrituras pendientes en un solo lote (`bulk_write` en MongoDB).
+        Si falla, los cambios vuelven a la cola (sin pisar los que llegaron mientras tanto).
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+            try:
+                await self.backend.upsert_many(batch)
+                logger.info(
+                    f"Se volcaron las escrituras pendientes de {len(batch)} guild(s)."
+                )
+            except BaseException:
+                # También ante CancelledError: el lote no debe perderse si se cancela la tarea
+                for guild_id, fields in batch.items():
+                    self._pending[guild_id] = {**fields, **self._pending.get(guild_id, {})}
+                raise
+            finally:
+                self._flushing = {}
+
+    # ==========================================================================
+    # Invalidación de la caché entre procesos
+    # ==========================================================================
+    def start_change_watcher(self):
+        """
+        Inicia la tarea que refresca la caché con los cambios hechos por otros procesos
+        (el dashboard u otras instancias del bot). Solo actúa si `watch_changes` está activo.
+        """
+        if not self.watch_changes or self.backend is None:
+            return
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch_loop())
+
+    async def _watch_loop(self):
+        """Escucha el change stream del backend y, si no está disponible, recurre al polling."""
+        if self.backend.supports_change_stream:
+            try:
+                logger.info("Escuchando cambios de configuración mediante change streams.")
+                async for guild_id, document in self.backend.watch():
+                    self._refresh(guild_id, document)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    f"Change streams no disponibles ({e}). Se usará polling de 'updated_at'."
+                )
+        await self._poll_loop()
+
+    async def _poll_loop(self):
+        """Consulta periódicamente los documentos con `updated_at` posterior a la última consulta."""
+        # Se solapa un intervalo para tolerar diferencias de reloj entre procesos y servidor.
+        overlap = timedelta(seconds=self.poll_interval)
+        last_poll = datetime.now(timezone.utc)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            started = datetime.now(timezone.utc)
+            try:
+                for document in await self.backend.changed_since(last_poll - overlap):
+                    self._refresh(document["_id"], document)
+                last_poll = started
+            except Exception as e:
+                logger.error(f"Error al consultar cambios de configuración: {e}")
+
+    def _refresh(self, guild_id: int, document: Optional[dict]):
+        """
+        Aplica un cambio externo: refresca la configuración si el guild está en memoria
+        (caché o índice de canales). Un documento None indica que fue eliminado.
+        """
+        if guild_id not in self.cache and not self.channel_index.knows_guild(guild_id):
+            return
+        # Una lectura en curso podría traer el estado anterior: la descartamos.
+        self._begin_write(guild_id)
+        self._inflight.pop(guild_id, None)
+        self._store(
+            guild_id, GuildConfig.from_document(self._apply_pending(guild_id, document))
+        )
+
+    async def close(self):
+        """Vuelca las escrituras pendientes y cierra la conexión con la base de datos."""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        if self._flush_task is not None:
+            # Se espera a que termine el volcado en curso antes de cancelar el bucle
+            async with self._flush_lock:
+                self._flush_task.cancel()
+            self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"No se pudieron volcar las escrituras pendientes al cerrar: {e}")
+        if self.backend is not None:
+            self._log_metrics()
+            await self.backend.close()
+
+    def _log_metrics(self):
+        """Registra las métricas acumuladas de la caché y de MongoDB (solo van al log)."""
+        cache = self.cache_stats()
+        logger.info(
+            f"Caché de configuraciones: {cache['size']}/{cache['max_size']} guilds, "
+            f"{cache['hits']} aciertos, {cache['misses']} fallos ({cache['hit_ratio']:.1%})."
+        )
+        if self.backend.name != "mongo":
+            return
+        metrics = self.mongo_metrics()
+        pool = metrics["pool"]
+        logger.info(
+            f"Pool de MongoDB: máximo de conexiones en uso {pool['max_checked_out']}, "
+            f"espera de checkout p95 {pool['checkout_wait']['p95_ms']:.1f} ms, "
+            f"checkouts fallidos {pool['checkout_failures']}, reinicios {pool['pool_clears']}."
+        )
+        top = sorted(metrics["commands"].items(), key=lambda item: -item[1]["count"])
+        for name, histogram in top[:LOGGED_MONGO_COMMANDS]:
+            logger.info(
+                f"Comando de MongoDB {name}: {histogram['count']} llamadas, "
+                f"p50 {histogram['p50_ms']:.0f} ms, p95 {histogram['p95_ms']:.0f} ms, "
+                f"errores {histogram['failures']}."
+            )
@@ -0,0 +1,412 @@
+# app/core/dice.py
+import math
+import re
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+# ==============================================================================
+# Límites del motor de dados
+# ==============================================================================
+MAX_DICE = 1_000_000  # Dados por tirada (sumando todos los términos)
+MAX_SIDES = 100_000
+MAX_EXPLOSION_ROUNDS = 100  # Rondas de dados explosivos en una tirada
+MAX_STATS_SPAN = 2_000_000  # Cantidad máxima de totales distintos en una distribución
+MAX_KEEP_STATS_DICE = 60  # Dados máximos para calcular distribuciones con keep/drop
+MAX_KEEP_STATS_SIDES = 100
+EXPLOSION_EPSILON = 1e-12  # Probabilidad a partir de la cual se truncan las explosiones
+
+_TERM = re.compile(
+    r"([+-])?(?:(\d*)d(\d+|%)((?:kh\d+|kl\d+|k\d+|dh\d+|dl\d+|d\d+|!|r\d*)*)|(\d+))"
+)
+_MODIFIER = re.compile(r"(kh|kl|k|dh|dl|d)(\d+)|(!)|r(\d*)")
+# "3d6 5" o "2d6 d8": dos términos sin operador. Los modificadores separados por espacios
+# ("4d6 kh3", "1d20 !") sí se aceptan.
+_SPLIT_NUMBER = re.compile(r"[\d%!]\s+(?:\d|d[\d%])")
+
+
+class DiceError(ValueError):
+    """Expresión de dados inválida o fuera de los límites."""
+
+
+# ==============================================================================
+# AST de una expresión
+# ==============================================================================
+class DiceTerm:
+    """Término `NdS` con sus modificadores (keep/drop, explosivos, re-tirada)."""
+
+    __slots__ = ("sign", "count", "sides", "keep", "keep_highest", "explode", "reroll")
+
+    def __init__(
+        self,
+        sign: int,
+        count: int,
+        sides: int,
+        keep: Optional[int] = None,
+        keep_highest: bool = True,
+        explode: bool = False,
+        reroll: int = 0,
+    ):
+        self.sign = sign
+        self.count = count
+        self.sides = sides
+        self.keep = keep  # Cantidad de dados que se conservan (None = todos)
+        self.keep_highest = keep_highest
+        self.explode = explode
+        self.reroll = reroll  # Se vuelven a tirar (una vez) los resultados <= reroll
+
+    def __repr__(self) -> str:
+        text = f"{'-' if self.sign < 0 else ''}{self.count}d{self.sides}"
+        if self.explode:
+            text += "!"
+        if self.reroll:
+            text += f"r{self.reroll}"
+        if self.keep is not None:
+            text += f"{'kh' if self.keep_highest else 'kl'}{self.keep}"
+        return text
+
+
+class ConstantTerm:
+    __slots__ = ("sign", "value")
+
+    def __init__(self, sign: int, value: int):
+        self.sign = sign
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f"{'-' if self.sign < 0 else ''}{self.value}"
+
+
+class DiceExpression:
+    """Expresión compilada: suma de términos de dados y constantes."""
+
+    __slots__ = ("text", "terms")
+
+    def __init__(self, text: str, terms: tuple):
+        self.text = text
+        self.terms = terms
+
+    @property
+    def dice_terms(self) -> list:
+        return [term for term in self.terms if isinstance(term, DiceTerm)]
+
+    @property
+    def constant(self) -> int:
+        return sum(t.sign * t.value for t in self.terms if isinstance(t, ConstantTerm))
+
+
+def _parse_term(match: re.Match, first: bool) -> object:
+    sign_text, count_text, sides_text, modifiers, constant = match.groups()
+    if sign_text is None and not first:
+        raise DiceError("Falta un '+' o '-' entre los términos.")
+    sign = -1 if sign_text == "-" else 1
+    if constant is not None:
+        return ConstantTerm(sign, int(constant))
+
+    count = int(count_text) if count_text else 1
+    sides = 100 if sides_text == "%" else int(sides_text)
+    if count < 1 or sides < 2:
+        raise DiceError("Cada término necesita al menos 1 dado de 2 caras o más.")
+    if sides > MAX_SIDES:
+        raise DiceError(f"Los dados pueden tener como mucho {MAX_SIDES} caras.")
+
+    term = DiceTerm(sign, count, sides)
+    for keep_kind, amount, explode, reroll in _MODIFIER.findall(modifiers):
+        if explode:
+            term.explode = True
+        elif keep_kind:
+            if term.keep is not None:
+                raise DiceError("Solo se permite un modificador de conservar/descartar por término.")
+            amount = int(amount)
+            if amount > count:
+                raise DiceError(f"No se pueden conservar/descartar {amount} de {count} dados.")
+            if keep_kind in ("kh", "k"):
+                term.keep, term.keep_highest = amount, True
+            elif keep_kind == "kl":
+                term.keep, term.keep_highest = amount, False
+            elif keep_kind == "dh":
+                term.keep, term.keep_highest = count - amount, False
+            else:  # 'dl' o 'd': descartar los más bajos
+                term.keep, term.keep_highest = count - amount, True
+        else:
+            term.reroll = int(reroll) if reroll else 1
+            if term.reroll >= sides:
+                raise DiceError("La re-tirada no puede cubrir todas las caras del dado.")
+    return term
+
+
+@lru_cache(maxsize=512)
+def _compile(text: str) -> DiceExpression:
+    terms = []
+    position = 0
+    while position < len(text):
+        match = _TERM.match(text, position)
+        if not match or match.end() == position:
+            raise DiceError(f"No se entiende la expresión cerca de '{text[position:]}'.")
+        terms.append(_parse_term(match, first=not terms))
+        position = match.end()
+    if not terms:
+        raise DiceError("La expresión está vacía.")
+    if sum(t.count for t in terms if isinstance(t, DiceTerm)) > MAX_DICE:
+        raise DiceError(f"Como mucho se pueden tirar {MAX_DICE} dados.")
+    return DiceExpression(text, tuple(terms))
+
+
+def compile_expression(expression: str) -> DiceExpression:
+    """
+    Compila (y memoriza) una expresión como `4d6kh3+2d8+5`, `1d20!`, `2d6r2` o `d%`.
+
+    Modificadores: `khN`/`kN` conservar los N más altos, `klN` los más bajos, `dhN`/`dlN`
+    (o `dN`) descartar los N más altos/bajos, `!` dados explosivos y `rN` volver a tirar
+    una vez los resultados menores o iguales a N (`r` solo = los 1).
+
+    Raises:
+        DiceError: Si la expresión es inválida.
+    """
+    expression = expression.lower()
+    if _SPLIT_NUMBER.search(expression):
+        raise DiceError("Falta un '+' o '-' entre los términos.")
+    return _compile(re.sub(r"\s+", "", expression))
+
+
+# ==============================================================================
+# Tiradas (muestreo vectorizado)
+# ==============================================================================
+class TermRoll:
+    __slots__ = ("term", "kept", "dropped", "total")
+
+    def __init__(self, term: DiceTerm, kept: np.ndarray, dropped: np.ndarray):
+        self.term = term
+        self.kept = kept
+        self.dropped = dropped
+        self.total = term.sign * int(kept.sum())
+
+
+class RollResult:
+    __slots__ = ("expression", "rolls", "total")
+
+    def __init__(self, expression: DiceExpression, rolls: list):
+        self.expression = expression
+        self.rolls = rolls
+        self.total = sum(roll.total for roll in rolls) + expression.constant
+
+
+def _roll_term(term: DiceTerm, rng: np.random.Generator) -> TermRoll:
+    values = rng.integers(1, term.sides + 1, size=term.count)
+    if term.reroll:
+        low = values <= term.reroll
+        values[low] = rng.integers(1, term.sides + 1, size=int(low.sum()))
+    if term.explode:
+        pending = int((values == term.sides).sum())
+        extra = []
+        for _ in range(MAX_EXPLOSION_ROUNDS):
+            if not pending:
+                break
+            new = rng.integers(1, term.sides + 1, size=pending)
+            extra.append(new)
+            pending = int((new == term.sides).sum())
+        if extra:
+            values = np.concatenate([values, *extra])
+
+    if term.keep is None or term.keep >= len(values):
+        return TermRoll(term, values, values[:0])
+    order = np.argsort(values, kind="stable")
+    if term.keep_highest:
+        order = order[::-1]
+    kept_index = np.sort(order[: term.keep])
+    dropped_index = np.sort(order[term.keep :])
+    return TermRoll(term, values[kept_index], values[dropped_index])
+
+
+def roll(expression: DiceExpression, rng: Optional[np.random.Generator] = None) -> RollResult:
+    """Tira una expresión compilada."""
+    rng = rng or np.random.default_rng()
+    return RollResult(expression, [_roll_term(t, rng) for t in expression.dice_terms])
+
+
+# ==============================================================================
+# Distribuciones exactas
+# ==============================================================================
+class Distribution:
+    """
+    Distribución de probabilidad de un total entero: `probs[i]` = P(total = offset + i).
+    `minimum`/`maximum` son los límites exactos de la expresión (None = sin límite, por
+    dados explosivos); las colas explosivas de `probs` están truncadas.
+    """
+
+    __slots__ = ("offset", "probs", "minimum", "maximum")
+
+    def __init__(
+        self,
+        offset: int,
+        probs: np.ndarray,
+        minimum: Optional[int],
+        maximum: Optional[int],
+    ):
+        self.offset = offset
+        self.probs = probs
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @property
+    def values(self) -> np.ndarray:
+        return np.arange(self.offset, self.offset + len(self.probs))
+
+    @property
+    def mean(self) -> float:
+        return float(np.dot(self.values, self.probs))
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(max(0.0, float(np.dot((self.values - self.mean) ** 2, self.probs))))
+
+    @property
+    def mode(self) -> int:
+        return self.offset + int(np.argmax(self.probs))
+
+    def at_least(self, target: int) -> float:
+        """P(total >= target)."""
+        index = max(0, target - self.offset)
+        return float(self.probs[index:].sum()) if index < len(self.probs) else 0.0
+
+    def percentile(self, fraction: float) -> int:
+        index = int(np.searchsorted(np.cumsum(self.probs), fraction - 1e-9))
+        return self.offset + min(index, len(self.probs) - 1)
+
+
+def _convolve(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Convolución directa para vectores chicos y por FFT para los grandes."""
+    if min(len(a), len(b)) < 64:
+        return np.convolve(a, b)
+    size = len(a) + len(b) - 1
+    result = np.fft.irfft(np.fft.rfft(a, size) * np.fft.rfft(b, size), size)
+    return np.clip(result, 0.0, None)
+
+
+def _power(pmf: np.ndarray, times: int) -> np.ndarray:
+    """Suma de `times` variables independientes con la misma distribución (`pmf`)."""
+    size = (len(pmf) - 1) * times + 1
+    if size > MAX_STATS_SPAN:
+        raise DiceError("La distribución es demasiado grande para calcularla.")
+    if times == 1:
+        return pmf
+    if len(pmf) * times < 256:
+        result = pmf
+        for _ in range(times - 1):
+            result = np.convolve(result, pmf)
+        return result
+    # Un solo par de FFT: la transformada de la suma es la potencia de la transformada
+    result = np.fft.irfft(np.fft.rfft(pmf, size) ** times, size)
+    return np.clip(result, 0.0, None)
+
+
+def _die_pmf(term: DiceTerm) -> tuple:
+    """Distribución de un solo dado del término. Retorna (offset, probs)."""
+    sides = term.sides
+    pmf = np.full(sides, 1.0 / sides)
+    if term.reroll:
+        # Los resultados <= reroll se vuelven a tirar una vez
+        pmf = pmf * (1.0 / sides) * term.reroll
+        pmf[term.reroll :] += 1.0 / sides
+    if not term.explode:
+        return 1, pmf
+
+    # Dado explosivo: cada máximo suma `sides` y se tira otro dado (uniforme)
+    uniform = np.full(sides, 1.0 / sides)
+    rounds = max(1, math.ceil(math.log(EXPLOSION_EPSILON) / math.log(1.0 / sides)))
+    rounds = min(rounds, MAX_STATS_SPAN // sides - 1)
+    probs = np.zeros(sides * (rounds + 1))
+    probs[: sides - 1] = pmf[: sides - 1]
+    carry = pmf[sides - 1]  # Probabilidad de seguir explotando
+    for depth in range(1, rounds + 1):
+        start = depth * sides
+        probs[start : start + sides - 1] = carry * uniform[: sides - 1]
+        carry *= uniform[sides - 1]
+    return 1, probs
+
+
+def _keep_distribution(term: DiceTerm) -> tuple:
+    """
+    Distribución de la suma de los `keep` dados más altos (o más bajos) de `count`.
+
+    Programación dinámica sobre las caras en orden (de mayor a menor si se conservan los
+    altos): el estado es (dados asignados, suma de los conservados); en cada cara se elige
+    cuántos dados la muestran, ponderando por combinaciones y probabilidad de la cara.
+    """
+    count, keep, sides = term.count, term.keep, term.sides
+    if count > MAX_KEEP_STATS_DICE or sides > MAX_KEEP_STATS_SIDES:
+        raise DiceError(
+            f"Las estadísticas con conservar/descartar admiten hasta {MAX_KEEP_STATS_DICE} "
+            f"dados de {MAX_KEEP_STATS_SIDES} caras."
+        )
+    _, face_pmf = _die_pmf(term)
+    faces = range(sides, 0, -1) if term.keep_highest else range(1, sides + 1)
+    max_sum = keep * sides
+    # dp[j] = probabilidades de la suma conservada con j dados ya asignados
+    dp = np.zeros((count + 1, max_sum + 1))
+    dp[0, 0] = 1.0
+    binomial = np.array([[math.comb(n, c) for c in range(count + 1)] for n in range(count + 1)])
+    for face in faces:
+        p = face_pmf[face - 1]
+        if p == 0:
+            continue
+        new = np.zeros_like(dp)
+        for assigned in range(count + 1):
+            row = dp[assigned]
+            if not row.any():
+                continue
+            for shown in range(count - assigned + 1):
+                kept = min(assigned + shown, keep) - min(assigned, keep)
+                weight = binomial[count - assigned, shown] * p**shown
+                shift = face * kept
+                new[assigned + shown, shift:] += weight * row[: max_sum + 1 - shift]
+        dp = new
+    return 0, dp[count]
+
+
+def _term_bounds(term: DiceTerm) -> tuple:
+    """Total mínimo y máximo de un término (None = sin límite)."""
+    kept = term.count if term.keep is None else term.keep
+    low, high = kept, None if term.explode else kept * term.sides
+    if term.sign < 0:
+        return (-high if high is not None else None), -low
+    return low, high
+
+
+def _add_bound(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    return None if a is None or b is None else a + b
+
+
+def _term_distribution(term: DiceTerm) -> tuple:
+    if term.keep is not None and term.keep < term.count:
+        if term.explode:
+            raise DiceError("No hay estadísticas para dados explosivos con conservar/descartar.")
+        offset, probs = _keep_distribution(term)
+    else:
+        offset, pmf = _die_pmf(term)
+        probs = _power(pmf, term.count)
+        offset *= term.count
+    if term.sign < 0:
+        return -(offset + len(probs) - 1), probs[::-1]
+    return offset, probs
+
+
+def distribution(expression: DiceExpression) -> Distribution:
+    """
+    Distribución exacta del total de una expresión (convolución de los términos).
+
+    Raises:
+        DiceError: Si la distribución excede los límites de cálculo.
+    """
+    offset, probs = expression.constant, np.ones(1)
+    minimum = maximum = expression.constant
+    for term in expression.dice_terms:
+        term_offset, term_probs = _term_distribution(term)
+        if len(probs) + len(term_probs) - 1 > MAX_STATS_SPAN:
+            raise DiceError("La distribución es demasiado grande para calcularla.")
+        probs = _convolve(probs, term_probs)
+        offset += term_offset
+        low, high = _term_bounds(term)
+        minimum, maximum = _add_bound(minimum, low), _add_bound(maximum, high)
+    return Distribution(offset, probs / probs.sum(), minimum, maximum)
@@ -0,0 +1,88 @@
+# app/core/event_context.py
+import asyncio
+from contextvars import ContextVar
+from typing import Optional
+
+import discord
+
+from ..schemas.guild_config import GuildConfig
+
+# Contexto del evento de gateway en curso. `Diami.dispatch` lo fija antes de programar los
+# listeners; como asyncio copia los contextvars al crear cada tarea, todos los listeners
+# de un mismo evento ven la misma instancia.
+_current_event: ContextVar[Optional["EventContext"]] = ContextVar(
+    "diami_event_context", default=None
+)
+
+
+# ==============================================================================
+# Contexto compartido por evento
+# ==============================================================================
+class EventContext:
+    """
+    Datos compartidos por todos los listeners de un mismo evento (por ejemplo, los
+    `on_member_join` de LoggingEvents y MemberEvents). Se resuelven de forma perezosa
+    y se memorizan durante la vida del evento.
+    """
+
+    __slots__ = ("bot", "event_name", "_configs", "_channels")
+
+    def __init__(self, bot: discord.Client, event_name: str):
+        self.bot = bot
+        self.event_name = event_name
+        self._configs: Optional[dict[int, asyncio.Future]] = None
+        self._channels: Optional[dict[int, object]] = None
+
+    async def guild_config(self, guild_id: int) -> Optional[GuildConfig]:
+        """Configuración del guild; la primera llamada la obtiene y el resto la comparte."""
+        if self._configs is None:
+            self._configs = {}
+        future = self._configs.get(guild_id)
+        if future is None:
+            future = asyncio.ensure_future(self.bot.db_manager.get_guild_config(guild_id))
+            self._configs[guild_id] = future
+        return await asyncio.shield(future)
+
+    def channel(self, channel_id: Optional[int]):
+        """Canal resuelto por ID (`get_channel` recorre todos los guilds del bot)."""
+        if channel_id is None:
+            return None
+        if self._channels is None:
+            self._channels = {}
+        if channel_id not in self._channels:
+            self._channels[channel_id] = self.bot.get_channel(channel_id)
+        return self._channels[channel_id]
+
+
+def begin_event(bot: discord.Client, event_name: str):
+    """Crea el contexto de un evento y lo fija como actual. Retorna el token para `end_event`."""
+    return _current_event.set(EventContext(bot, event_name))
+
+
+def end_event(token):
+    """Restaura el contexto previo al evento."""
+    _current_event.reset(token)
+
+
+def current_event() -> Optional[EventContext]:
+    """Retorna el contexto del evento en curso, o None fuera de un evento de gateway."""
+    return _current_event.get()
+
+
+# ==============================================================================
+# Accesos con respaldo para código que corre fuera de un evento
+# ==============================================================================
+async def event_guild_config(bot: discord.Client, guild_id: int) -> Optional[GuildConfig]:
+    """Configuración del guild compartida dentro del evento actual (o lectura directa)."""
+    context = current_event()
+    if context is None:
+        return await bot.db_manager.get_guild_config(guild_id)
+    return await context.guild_config(guild_id)
+
+
+def event_channel(bot: discord.Client, channel_id: Optional[int]):
+    """Canal resuelto y compartido dentro del evento actual (o `get_channel` directo)."""
+    context = current_event()
+    if context is None:
+        return bot.get_channel(channel_id) if channel_id is not None else None
+    return context.channel(channel_id)
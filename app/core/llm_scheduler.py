@@ -0,0 +1,246 @@
+# app/core/llm_scheduler.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger("discord")
+
+# ==============================================================================
+# Clases de prioridad (menor valor = más prioritaria)
+# ==============================================================================
+PRIORITIES = {
+    "mention": 0,
+    "tarot": 1,
+    "welcome": 2,
+    "greeting": 3,
+    "proactive": 4,
+}
+DEFAULT_PRIORITY = "mention"
+# A partir de esta prioridad, las peticiones se descartan cuando la cola está cargada
+SHEDDABLE_PRIORITY = PRIORITIES["greeting"]
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_MINUTE = 60.0
+DEFAULT_BURST = 10
+DEFAULT_MAX_QUEUE = 100
+DEFAULT_SHED_DEPTH = 20
+
+
+class LLMOverloaded(Exception):
+    """La petición se descartó porque la cola del scheduler está saturada."""
+
+
+# ==============================================================================
+# Limitador de tasa (token bucket)
+# ==============================================================================
+class TokenBucket:
+    """Token bucket clásico: `rate` tokens por segundo, hasta `capacity` acumulados."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self) -> float:
+        """Consume un token y retorna 0, o retorna los segundos que faltan para el próximo."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _Job:
+    __slots__ = ("factory", "future", "priority", "enqueued_at")
+
+    def __init__(self, factory: Callable[[], Awaitable], future: asyncio.Future, priority: int):
+        self.factory = factory
+        self.future = future
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+
+
+# ==============================================================================
+# Scheduler de peticiones al LLM
+# ==============================================================================
+class LLMScheduler:
+    """
+    Punto único por el que pasan las llamadas a Gemini.
+
+    - Concurrencia acotada (`max_concurrency` llamadas en vuelo).
+    - Prioridades: mención > tarot > bienvenida > saludo > proactiva.
+    - Cola justa por guild: dentro de una prioridad, los guilds se atienden por turnos, así
+      un raid en un servidor no deja sin respuesta al resto.
+    - Token bucket para respetar la cuota de peticiones por minuto.
+    - Descarte de trabajo de baja prioridad (saludos, proactiva) cuando la cola supera
+      `shed_depth`; al llegar trabajo prioritario con la cola cargada se desaloja el trabajo
+      descartable más reciente.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        burst: int = DEFAULT_BURST,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        shed_depth: int = DEFAULT_SHED_DEPTH,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.shed_depth = shed_depth
+        self.bucket = TokenBucket(requests_per_minute / 60, burst)
+        # Una cola por prioridad; cada una es un OrderedDict guild_id -> deque de jobs
+        self._queues: list[OrderedDict] = [OrderedDict() for _ in range(len(PRIORITIES))]
+        self._queued = 0
+        self._running = 0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        # Referencias a los jobs en vuelo, para que no se recolecten y poder cancelarlos
+        self._tasks: set[asyncio.Task] = set()
+        self._closed = False
+        self.shed_count = 0
+        self.completed = 0
+
+    async def submit(
+        self,
+        factory: Callable[[], Awaitable],
+        priority: str = DEFAULT_PRIORITY,
+        guild_id: Optional[int] = None,
+    ):
+        """
+        Encola una llamada y espera su resultado.
+
+        Args:
+            factory (callable): Función sin argumentos que retorna la corrutina a ejecutar.
+            priority (str): Clase de prioridad ('mention', 'tarot', 'welcome', ...).
+            guild_id (int, opcional): Guild de origen, para la cola justa.
+
+        Raises:
+            LLMOverloaded: Si la petición se descarta por saturación.
+        """
+        level = PRIORITIES.get(priority, PRIORITIES[DEFAULT_PRIORITY])
+        if self._queued >= self.shed_depth:
+            overloaded = (
+                level >= SHEDDABLE_PRIORITY
+                or not self._shed_one(level)
+                and self._queued >= self.max_queue
+            )
+            if overloaded:
+                self.shed_count += 1
+                raise LLMOverloaded(f"Cola del LLM saturada ({self._queued} en espera)")
+
+        job = _Job(factory, asyncio.get_running_loop().create_future(), level)
+        self._queues[level].setdefault(guild_id, deque()).append(job)
+        self._queued += 1
+        self._pump()
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            # Si el llamador se cancela antes de que arranque, el job queda marcado y se salta
+            job.future.cancel()
+            raise
+
+    def _shed_one(self, level: int) -> bool:
+        """Desaloja el job descartable más reciente de menor prioridad que `level`."""
+        for queue in reversed(self._queues[max(level + 1, SHEDDABLE_PRIORITY) :]):
+            for guild_id in reversed(list(queue)):
+                jobs = queue[guild_id]
+                while jobs:
+                    job = jobs.pop()
+                    self._queued -= 1
+                    if job.future.done():
+                        continue  # Su llamador ya se canceló: no cuenta como desalojo
+                    if not jobs:
+                        del queue[guild_id]
+                    self.shed_count += 1
+                    job.future.set_exception(LLMOverloaded("Desalojada por trabajo prioritario"))
+                    return True
+                del queue[guild_id]
+        return False
+
+    def _next_job(self) -> Optional[_Job]:
+        """Toma el siguiente job: la prioridad más alta, rotando entre guilds."""
+        for queue in self._queues:
+            while queue:
+                guild_id, jobs = next(iter(queue.items()))
+                job = jobs.popleft()
+                if jobs:
+                    queue.move_to_end(guild_id)  # El guild vuelve al final de su turno
+                else:
+                    del queue[guild_id]
+                self._queued -= 1
+                if not job.future.done():
+                    return job
+        return None
+
+    def _pump(self):
+        """Arranca jobs mientras haya lugar y tokens; si falta un token, se reprograma."""
+        while not self._closed and self._running < self.max_concurrency and self._queued:
+            wait = self.bucket.try_take()
+            if wait:
+                if self._wakeup is None:
+                    self._wakeup = asyncio.get_running_loop().call_later(wait, self._wake)
+                return
+            job = self._next_job()
+            if job is None:
+                # Solo quedaban jobs cancelados: se devuelve el token
+                self.bucket.tokens = min(self.bucket.capacity, self.bucket.tokens + 1)
+                return
+            self._running += 1
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _wake(self):
+        self._wakeup = None
+        self._pump()
+
+    async def _run(self, job: _Job):
+        waited = time.monotonic() - job.enqueued_at
+        if waited >= 1:
+            logger.debug(f"Petición al LLM esperó {waited:.1f}s en la cola (prioridad {job.priority}).")
+        try:
+            result = await job.factory()
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._running -= 1
+            self.completed += 1
+            self._pump()
+
+    def close(self):
+        """Cancela los jobs en vuelo y los que siguen en la cola."""
+        self._closed = True
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        for task in list(self._tasks):
+            task.cancel()
+        for queue in self._queues:
+            for jobs in queue.values():
+                for job in jobs:
+                    job.future.cancel()
+            queue.clear()
+        self._queued = 0
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queued,
+            "running": self._running,
+            "completed": self.completed,
+            "shed": self.shed_count,
+        }
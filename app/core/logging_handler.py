@@ -32,8 +32,8 @@ class LoggingHandler(logging.Handler):
         """
         if guild_id is not None:
             config = await self.db_manager.get_guild_config(guild_id)
-            if config and "log_channel_id" in config:
-                channel = self.bot.get_channel(config["log_channel_id"])
+            if config and config.log_channel_id:
+                channel = self.bot.get_channel(config.log_channel_id)
                 if channel:
                     return channel
         # Si no hay guild_id o no se encuentra el canal, usar el canal por defecto
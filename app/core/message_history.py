@@ -0,0 +1,222 @@
+# app/core/message_history.py
+import asyncio
+from collections import OrderedDict
+from typing import Optional
+
+import discord
+
+HISTORY_LIMIT = 100  # Mensajes por canal que se mantienen en memoria
+
+
+# ==============================================================================
+# Registro compacto de un mensaje
+# ==============================================================================
+class MessageRecord:
+    """
+    Lo mínimo que necesita el prompt de un mensaje, con el contenido ya escapado.
+    Es inmutable: una edición reemplaza el registro, así que el fragmento XML memorizado
+    nunca queda desactualizado.
+    """
+
+    __slots__ = ("id", "author", "content", "attachments", "_fragment")
+
+    def __init__(self, message_id: int, author: str, content: str, attachments: int):
+        self.id = message_id
+        self.author = author
+        self.content = content
+        self.attachments = attachments
+        self._fragment: Optional[str] = None
+
+    @property
+    def fragment(self) -> str:
+        """Fragmento `<mensaje>` del historial, construido una sola vez por registro."""
+        if self._fragment is None:
+            content = self.content
+            if self.attachments:
+                content += f" [El usuario adjuntó {self.attachments} imagen(es)]"
+            self._fragment = (
+                f"<mensaje><usuario>{self.author}</usuario>"
+                f"<contenido>{content.strip()}</contenido></mensaje>"
+            )
+        return self._fragment
+
+    @staticmethod
+    def escape(content: str) -> str:
+        content = discord.utils.escape_markdown(content or "")
+        return discord.utils.escape_mentions(content)
+
+    @classmethod
+    def from_message(cls, message: discord.Message) -> "MessageRecord":
+        return cls(
+            message.id,
+            message.author.display_name,
+            cls.escape(message.content),
+            len(message.attachments),
+        )
+
+
+# ==============================================================================
+# Historial de un canal
+# ==============================================================================
+class ChannelHistory:
+    """
+    Buffer circular de los últimos mensajes de un canal, indexado por ID.
+
+    Además guarda la última unión de fragmentos (`_joined`, cada fragmento terminado en
+    salto de línea). Si desde entonces solo llegaron mensajes nuevos, `render` agrega los
+    fragmentos nuevos al final (y recorta los desalojados al principio) en lugar de volver
+    a unir todo; ediciones, borrados y el backfill invalidan la unión.
+    """
+
+    __slots__ = ("limit", "records", "primed", "lock", "_joined", "_pending")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.records: OrderedDict[int, MessageRecord] = OrderedDict()
+        self.primed = False  # True una vez que se completó con el historial vía REST
+        self.lock = asyncio.Lock()
+        self._joined: Optional[str] = None
+        self._pending: list[MessageRecord] = []  # Agregados después de la última unión
+
+    def append(self, record: MessageRecord):
+        if record.id in self.records:
+            self.replace(record)
+            return
+        self.records[record.id] = record
+        self._pending.append(record)
+        while len(self.records) > self.limit:
+            _, evicted = self.records.popitem(last=False)
+            if self._pending and self._pending[0] is evicted:
+                self._pending.pop(0)
+            elif self._joined is not None:
+                self._joined = self._joined[len(evicted.fragment) + 1 :]
+
+    def replace(self, record: MessageRecord):
+        self.records[record.id] = record
+        self.invalidate()
+
+    def remove(self, message_id: int):
+        if self.records.pop(message_id, None) is not None:
+            self.invalidate()
+
+    def merge(self, backfill: list):
+        """Une el historial obtenido por REST con lo que llegó por el gateway mientras tanto."""
+        merged = {record.id: record for record in backfill}
+        merged.update(self.records)
+        newest = sorted(merged)[-self.limit :]
+        self.records = OrderedDict((message_id, merged[message_id]) for message_id in newest)
+        self.invalidate()
+
+    def invalidate(self):
+        self._joined = None
+        self._pending = []
+
+    def render(self, incremental: bool = True, max_chars: Optional[int] = None) -> str:
+        """
+        Retorna los fragmentos `<mensaje>` unidos, del más antiguo al más reciente.
+        Con `max_chars`, descarta los mensajes más antiguos hasta que el resultado entre.
+        """
+        if not incremental or self._joined is None:
+            self._joined = "".join(f"{record.fragment}\n" for record in self.records.values())
+        elif self._pending:
+            self._joined += "".join(f"{record.fragment}\n" for record in self._pending)
+        self._pending = []
+        if max_chars is None or len(self._joined) <= max_chars:
+            return self._joined
+
+        kept = []
+        size = 0
+        for record in reversed(self.records.values()):
+            size += len(record.fragment) + 1
+            if size > max_chars:
+                break
+            kept.append(record.fragment)
+        kept.reverse()
+        return "".join(f"{fragment}\n" for fragment in kept)
+
+
+# ==============================================================================
+# Buffer de historial alimentado por el gateway
+# ==============================================================================
+class MessageHistoryBuffer:
+    """
+    Mantiene en memoria los últimos mensajes de los canales que interesan (los canales
+    principales), alimentado por los eventos de mensaje, edición y borrado del gateway.
+    Solo recurre a `channel.history` (REST) la primera vez que se pide un canal.
+    """
+
+    def __init__(self, limit: int = HISTORY_LIMIT, incremental: bool = True):
+        self.limit = limit
+        self.incremental = incremental  # Reutilizar la unión previa si solo cambió el final
+        self._channels: dict[int, ChannelHistory] = {}
+
+    def _channel(self, channel_id: int) -> ChannelHistory:
+        history = self._channels.get(channel_id)
+        if history is None:
+            history = self._channels[channel_id] = ChannelHistory(self.limit)
+        return history
+
+    def append(self, message: discord.Message):
+        """Registra un mensaje nuevo del canal."""
+        self._channel(message.channel.id).append(MessageRecord.from_message(message))
+
+    def edit(
+        self,
+        channel_id: int,
+        message_id: int,
+        content: str,
+        attachments: Optional[int] = None,
+    ):
+        """Actualiza el contenido de un mensaje si está en el buffer."""
+        history = self._channels.get(channel_id)
+        if history is None or message_id not in history.records:
+            return
+        previous = history.records[message_id]
+        history.replace(
+            MessageRecord(
+                message_id,
+                previous.author,
+                MessageRecord.escape(content),
+                previous.attachments if attachments is None else attachments,
+            )
+        )
+
+    def delete(self, channel_id: int, message_ids):
+        """Quita uno o varios mensajes borrados del buffer."""
+        history = self._channels.get(channel_id)
+        if history is None:
+            return
+        for message_id in message_ids:
+            history.remove(message_id)
+
+    def forget(self, channel_id: int):
+        """Descarta el buffer de un canal; el próximo pedido lo vuelve a completar vía REST."""
+        self._channels.pop(channel_id, None)
+
+    def clear(self):
+        """Descarta todos los buffers (p. ej. tras una reconexión en la que se perdieron eventos)."""
+        self._channels.clear()
+
+    async def render(
+        self, channel: discord.TextChannel, max_chars: Optional[int] = None
+    ) -> str:
+        """
+        Retorna el historial del canal como fragmentos `<mensaje>` unidos.
+        En un arranque en frío, completa el buffer una sola vez con `channel.history`.
+        """
+        history = await self._primed(channel)
+        return history.render(self.incremental, max_chars)
+
+    async def _primed(self, channel: discord.TextChannel) -> ChannelHistory:
+        history = self._channel(channel.id)
+        if not history.primed:
+            async with history.lock:
+                if not history.primed:
+                    backfill = [
+                        MessageRecord.from_message(message)
+                        async for message in channel.history(limit=self.limit)
+                    ]
+                    backfill.reverse()
+                    history.merge(backfill)
+                    history.primed = True
+        return history
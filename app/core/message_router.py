@@ -0,0 +1,156 @@
+# app/core/message_router.py
+import asyncio
+import logging
+from typing import Awaitable, Callable, Iterable, Optional
+
+import discord
+
+from .channel_index import config_channel_roles
+from .event_context import current_event
+from ..schemas.guild_config import GuildConfig
+
+logger = logging.getLogger("discord")
+
+
+# ==============================================================================
+# Contexto compartido de un mensaje
+# ==============================================================================
+class MessageContext:
+    """Datos resueltos una sola vez por mensaje y compartidos por todos los handlers."""
+
+    __slots__ = ("message", "config", "roles")
+
+    def __init__(
+        self,
+        message: discord.Message,
+        config: Optional[GuildConfig],
+        roles: frozenset,
+    ):
+        self.message = message
+        self.config = config
+        self.roles = roles
+
+
+MessageHandler = Callable[[MessageContext], Awaitable[None]]
+MessageTrigger = Callable[[discord.Message], bool]
+
+
+class _Route:
+    __slots__ = ("handler", "roles", "trigger", "include_bots")
+
+    def __init__(
+        self,
+        handler: MessageHandler,
+        roles: Optional[frozenset],
+        trigger: Optional[MessageTrigger],
+        include_bots: bool,
+    ):
+        self.handler = handler
+        self.roles = roles
+        self.trigger = trigger
+        self.include_bots = include_bots
+
+    def matches(self, roles: frozenset, message: discord.Message) -> bool:
+        if message.author.bot and not self.include_bots:
+            return False
+        if self.roles is not None and self.roles.isdisjoint(roles):
+            return False
+        return self.trigger is None or self.trigger(message)
+
+
+# ==============================================================================
+# Enrutador central de mensajes
+# ==============================================================================
+class MessageRouter:
+    """
+    Único listener de `on_message` del bot. Descarta los DMs (y los mensajes de bots, salvo
+    para los handlers que los piden), resuelve una sola vez la configuración del guild y
+    el rol del canal, y entrega el mensaje solo a los handlers registrados para ese rol
+    (o cuyo trigger coincide).
+    Así, el costo por mensaje escala con los handlers relevantes y no con la cantidad de cogs.
+    """
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._routes: list[_Route] = []
+        self._bot_routes = False  # Si algún handler quiere mensajes de bots
+
+    def register(
+        self,
+        handler: MessageHandler,
+        roles: Optional[Iterable[str]] = None,
+        trigger: Optional[MessageTrigger] = None,
+        include_bots: bool = False,
+    ):
+        """
+        Registra un handler de mensajes.
+
+        Args:
+            handler (callable): Corrutina que recibe un `MessageContext`.
+            roles (Iterable[str], opcional): Roles de canal que le interesan ('main',
+                'suggestion', ...). None significa cualquier canal.
+            trigger (callable, opcional): Filtro síncrono y barato sobre el mensaje.
+            include_bots (bool): Si es True, también recibe mensajes de bots (incluida Diami).
+        """
+        self._routes.append(
+            _Route(
+                handler,
+                frozenset(roles) if roles is not None else None,
+                trigger,
+                include_bots,
+            )
+        )
+        self._bot_routes = any(route.include_bots for route in self._routes)
+
+    def unregister(self, handler: MessageHandler):
+        """Elimina todas las rutas de un handler (por ejemplo, al descargar un cog)."""
+        self._routes = [route for route in self._routes if route.handler != handler]
+        self._bot_routes = any(route.include_bots for route in self._routes)
+
+    async def dispatch(self, message: discord.Message):
+        """Listener de `on_message`: resuelve el contexto y lo entrega a los handlers."""
+        if not message.guild or not self._routes:
+            return
+        if message.author.bot and not self._bot_routes:
+            return
+
+        guild_id = message.guild.id
+        try:
+            # El índice de canales responde sin await si el guild ya fue cargado
+            roles = self.db_manager.channel_roles(guild_id, message.channel.id)
+            if roles is None:
+                config = await self._guild_config(guild_id)
+                roles = config_channel_roles(config, message.channel.id)
+
+            routes = [route for route in self._routes if route.matches(roles, message)]
+            if not routes:
+                return
+
+            config = await self._guild_config(guild_id)
+        except Exception as e:
+            logger.error(
+                f"Error al resolver el contexto del mensaje: {e}",
+                extra={"guild_id": guild_id},
+            )
+            return
+
+        context = MessageContext(message, config, roles)
+        await asyncio.gather(*(self._run(route.handler, context) for route in routes))
+
+    async def _guild_config(self, guild_id: int) -> Optional[GuildConfig]:
+        """Configuración del guild, compartida con los demás listeners del evento si los hay."""
+        context = current_event()
+        if context is None:
+            return await self.db_manager.get_guild_config(guild_id)
+        return await context.guild_config(guild_id)
+
+    async def _run(self, handler: MessageHandler, context: MessageContext):
+        """Ejecuta un handler aislando sus errores del resto."""
+        try:
+            await handler(context)
+        except Exception as e:
+            logger.error(
+                f"Error en el handler de mensajes {handler.__qualname__}: {e}",
+                exc_info=True,
+                extra={"guild_id": context.message.guild.id},
+            )
@@ -0,0 +1,200 @@
+# app/core/metrics.py
+import bisect
+import threading
+import time
+
+from pymongo import monitoring
+
+# ==============================================================================
+# Límites de los buckets de los histogramas (milisegundos)
+# ==============================================================================
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+# ==============================================================================
+# Histograma de latencias
+# ==============================================================================
+class LatencyHistogram:
+    """
+    Histograma de latencias con buckets fijos. Es seguro entre hilos, ya que
+    PyMongo emite los eventos de monitoreo desde los hilos de trabajo de Motor.
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        # Un bucket extra para los valores por encima del último límite
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms: float):
+        """Registra una observación en milisegundos."""
+        index = bisect.bisect_left(self.buckets, value_ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total_ms += value_ms
+            self.max_ms = max(self.max_ms, value_ms)
+
+    def percentile(self, fraction: float) -> float:
+        """Estima un percentil (0-1) como el límite superior del bucket que lo contiene."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = fraction * self.count
+            accumulated = 0
+            for index, bucket_count in enumerate(self.counts):
+                accumulated += bucket_count
+                if accumulated >= target:
+                    return float(self.buckets[index]) if index < len(self.buckets) else self.max_ms
+            return self.max_ms
+
+    def snapshot(self) -> dict:
+        """Retorna un resumen del histograma."""
+        with self._lock:
+            count, total, maximum = self.count, self.total_ms, self.max_ms
+            buckets = dict(zip([*map(str, self.buckets), "+inf"], self.counts))
+        return {
+            "count": count,
+            "avg_ms": total / count if count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": maximum,
+            "buckets": buckets,
+        }
+
+
+# ==============================================================================
+# Listener de comandos de MongoDB
+# ==============================================================================
+class CommandLatencyListener(monitoring.CommandListener):
+    """Registra la latencia de cada comando, etiquetada por operación y colección."""
+
+    def __init__(self):
+        self.histograms: dict[tuple, LatencyHistogram] = {}
+        self.failures: dict[tuple, int] = {}
+        self._collections: dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, key: tuple) -> LatencyHistogram:
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            return histogram
+
+    def _pop_key(self, event) -> tuple:
+        request = (event.connection_id, event.request_id)
+        with self._lock:
+            collection = self._collections.pop(request, "-")
+        return event.command_name, collection
+
+    def started(self, event):
+        # En la mayoría de los comandos, el valor del nombre del comando es la colección
+        collection = event.command.get(event.command_name)
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = (
+                collection if isinstance(collection, str) else "-"
+            )
+
+    def succeeded(self, event):
+        self._histogram(self._pop_key(event)).observe(event.duration_micros / 1000)
+
+    def failed(self, event):
+        key = self._pop_key(event)
+        self._histogram(key).observe(event.duration_micros / 1000)
+        with self._lock:
+            self.failures[key] = self.failures.get(key, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            items = list(self.histograms.items())
+            failures = dict(self.failures)
+        return {
+            f"{operation}:{collection}": {
+                **histogram.snapshot(),
+                "failures": failures.get((operation, collection), 0),
+            }
+            for (operation, collection), histogram in items
+        }
+
+
+# ==============================================================================
+# Listener del pool de conexiones
+# ==============================================================================
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Registra las conexiones abiertas/en uso y el tiempo de espera para obtener una conexión."""
+
+    def __init__(self):
+        self.checkout_wait = LatencyHistogram()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+        self._lock = threading.Lock()
+        # Respaldo para versiones de PyMongo cuyos eventos no traen `duration` (< 4.7)
+        self._local = threading.local()
+
+    def _wait_ms(self, event) -> float:
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            return duration * 1000
+        started = getattr(self._local, "started", None)
+        return (time.perf_counter() - started) * 1000 if started else 0.0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self.checkout_wait.observe(self._wait_ms(event))
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        self.checkout_wait.observe(self._wait_ms(event))
+        with self._lock:
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = {
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+            }
+        return {**counters, "checkout_wait": self.checkout_wait.snapshot()}
@@ -0,0 +1,47 @@
+# app/core/prompt_budget.py
+import math
+
+# ==============================================================================
+# Estimación de tokens
+# ==============================================================================
+CHARS_PER_TOKEN = 4  # Aproximación de Gemini para texto: ~4 caracteres por token
+IMAGE_TOKENS = 258  # Costo aproximado de una imagen en el prompt
+
+# Presupuesto total de tokens de entrada por tipo de llamada (incluye la personalidad)
+DEFAULT_BUDGETS = {
+    "mention": 12000,
+    "greeting": 8000,
+    "proactive": 10000,
+    "command": 6000,
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata de los tokens de un texto."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def tokens_to_chars(tokens: int) -> int:
+    """Caracteres que caben aproximadamente en una cantidad de tokens."""
+    return max(0, tokens) * CHARS_PER_TOKEN
+
+
+# ==============================================================================
+# Presupuestos por tipo de llamada
+# ==============================================================================
+class PromptBudget:
+    """
+    Presupuestos de tokens de entrada por tipo de llamada ('mention', 'greeting',
+    'proactive', 'command'). La personalidad, el timestamp y el input del usuario son
+    fijos; lo que sobra del presupuesto es lo que puede ocupar el historial.
+    """
+
+    def __init__(self, budgets: dict = None):
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+
+    def budget(self, call_type: str) -> int:
+        return self.budgets.get(call_type, self.budgets["mention"])
+
+    def remaining(self, call_type: str, used_tokens: int) -> int:
+        """Tokens que quedan libres para el historial después de las partes fijas."""
+        return max(0, self.budget(call_type) - used_tokens)
@@ -0,0 +1,347 @@
+# app/core/storage.py
+import asyncio
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+import motor.motor_asyncio
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from .cache import apply_fields
+
+logger = logging.getLogger("discord")
+
+# ==============================================================================
+# Valores por defecto de los backends
+# ==============================================================================
+MONGO_DATABASE = "DiamiBotDB"
+MONGO_COLLECTION = "guild_configs"
+SQLITE_DEFAULT_PATH = "data/diami.sqlite3"
+BULK_FETCH_BATCH_SIZE = 500  # Documentos por lote del cursor en las lecturas masivas
+
+
+# ==============================================================================
+# Interfaz común de almacenamiento
+# ==============================================================================
+class StorageBackend(ABC):
+    """
+    Interfaz de almacenamiento de las configuraciones de los guilds.
+    Los documentos tienen la misma forma que en MongoDB (ver `get_default_guild_config`)
+    y las actualizaciones usan claves en notación de punto, como un `$set`.
+    Toda escritura actualiza la marca `updated_at`, usada para detectar cambios hechos
+    por otros procesos cuando no hay change streams.
+    """
+
+    name = "base"
+    supports_change_stream = False
+
+    @abstractmethod
+    async def get(self, guild_id: int) -> Optional[dict]:
+        """Retorna el documento de un guild o None si no existe."""
+
+    @abstractmethod
+    async def get_many(self, guild_ids: list) -> dict:
+        """Retorna un mapeo guild_id -> documento con los guilds que existen."""
+
+    @abstractmethod
+    async def upsert_fields(self, guild_id: int, fields: dict):
+        """Aplica un `$set` sobre el documento de un guild, creándolo si no existe."""
+
+    async def upsert_many(self, updates: dict):
+        """Aplica varios `$set` (guild_id -> campos). Los backends pueden hacerlo en lote."""
+        for guild_id, fields in updates.items():
+            await self.upsert_fields(guild_id, fields)
+
+    async def set_feature_flag(self, guild_id: int, feature_name: str, status: bool):
+        """Activa o desactiva una función de un guild."""
+        await self.upsert_fields(guild_id, {f"features.{feature_name}": status})
+
+    @abstractmethod
+    async def insert_if_missing(self, guild_id: int, document: dict) -> Optional[dict]:
+        """
+        Inserta `document` si el guild no tiene configuración, de forma atómica.
+
+        Returns:
+            Optional[dict]: El documento previo, o None si se insertó en esta llamada.
+        """
+
+    @abstractmethod
+    async def changed_since(self, since: datetime) -> list:
+        """Retorna los documentos modificados después de `since` (UTC)."""
+
+    def watch(self) -> AsyncIterator[tuple]:
+        """
+        Itera los cambios de la colección como tuplas (guild_id, documento o None si se borró).
+        Solo disponible si `supports_change_stream` es True.
+        """
+        raise NotImplementedError(f"El backend '{self.name}' no soporta change streams.")
+
+    async def close(self):
+        """Libera los recursos del backend."""
+
+
+# ==============================================================================
+# Backend MongoDB (Motor)
+# ==============================================================================
+class MotorBackend(StorageBackend):
+    """Backend sobre MongoDB usando el driver asíncrono Motor."""
+
+    name = "mongo"
+    supports_change_stream = True
+
+    def __init__(self, mongo_uri: str, **client_options):
+        self.client = motor.motor_asyncio.AsyncIOMotorClient(mongo_uri, **client_options)
+        self.db = self.client[MONGO_DATABASE]
+        self.collection = self.db[MONGO_COLLECTION]
+
+    async def get(self, guild_id: int) -> Optional[dict]:
+        return await self.collection.find_one({"_id": guild_id})
+
+    async def get_many(self, guild_ids: list) -> dict:
+        documents = {}
+        cursor = self.collection.find({"_id": {"$in": list(guild_ids)}}).batch_size(
+            BULK_FETCH_BATCH_SIZE
+        )
+        async for document in cursor:
+            documents[document["_id"]] = document
+        return documents
+
+    async def upsert_fields(self, guild_id: int, fields: dict):
+        await self.collection.update_one(
+            {"_id": guild_id},
+            {"$set": fields, "$currentDate": {"updated_at": True}},
+            upsert=True,  # Si el documento no existe, se creará con esta actualización
+        )
+
+    async def upsert_many(self, updates: dict):
+        operations = [
+            UpdateOne(
+                {"_id": guild_id},
+                {"$set": fields, "$currentDate": {"updated_at": True}},
+                upsert=True,
+            )
+            for guild_id, fields in updates.items()
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def insert_if_missing(self, guild_id: int, document: dict) -> Optional[dict]:
+        insert_fields = {k: v for k, v in document.items() if k != "_id"}
+        insert_fields["updated_at"] = datetime.now(timezone.utc)
+        try:
+            # Con BEFORE, None significa que el documento se insertó en esta llamada.
+            # $setOnInsert nunca modifica un documento existente, así que BEFORE == AFTER.
+            return await self.collection.find_one_and_update(
+                {"_id": guild_id},
+                {"$setOnInsert": insert_fields},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError:
+            # Dos upserts simultáneos sobre el mismo _id: el otro ganó la inserción.
+            return await self.collection.find_one({"_id": guild_id})
+
+    async def changed_since(self, since: datetime) -> list:
+        cursor = self.collection.find({"updated_at": {"$gt": since}}).batch_size(
+            BULK_FETCH_BATCH_SIZE
+        )
+        return [document async for document in cursor]
+
+    async def watch(self) -> AsyncIterator[tuple]:
+        # Requiere un replica set (basta uno de un solo nodo); si no, MongoDB lanza OperationFailure.
+        async with self.collection.watch(full_document="updateLookup") as stream:
+            async for change in stream:
+                guild_id = change["documentKey"]["_id"]
+                yield guild_id, change.get("fullDocument")
+
+    async def close(self):
+        self.client.close()
+
+
+# ==============================================================================
+# Backend en memoria (pruebas de carga / desarrollo)
+# ==============================================================================
+class MemoryBackend(StorageBackend):
+    """
+    Backend que guarda los documentos en un diccionario del proceso.
+    No persiste nada: pensado para pruebas de carga y desarrollo sin MongoDB.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._documents: dict[int, dict] = {}
+
+    async def get(self, guild_id: int) -> Optional[dict]:
+        document = self._documents.get(guild_id)
+        return copy.deepcopy(document) if document is not None else None
+
+    async def get_many(self, guild_ids: list) -> dict:
+        return {
+            guild_id: copy.deepcopy(self._documents[guild_id])
+            for guild_id in guild_ids
+            if guild_id in self._documents
+        }
+
+    async def upsert_fields(self, guild_id: int, fields: dict):
+        document = apply_fields(
+            guild_id, self._documents.get(guild_id), copy.deepcopy(fields)
+        )
+        document["updated_at"] = datetime.now(timezone.utc)
+        self._documents[guild_id] = document
+
+    async def insert_if_missing(self, guild_id: int, document: dict) -> Optional[dict]:
+        previous = self._documents.get(guild_id)
+        if previous is not None:
+            return copy.deepcopy(previous)
+        document = copy.deepcopy(document)
+        document["updated_at"] = datetime.now(timezone.utc)
+        self._documents[guild_id] = document
+        return None
+
+    async def changed_since(self, since: datetime) -> list:
+        return [
+            copy.deepcopy(document)
+            for document in self._documents.values()
+            if document["updated_at"] > since
+        ]
+
+
+# ==============================================================================
+# Backend SQLite (instalaciones de un solo nodo)
+# ==============================================================================
+class SQLiteBackend(StorageBackend):
+    """
+    Backend sobre un archivo SQLite en modo WAL. Cada documento se guarda como JSON
+    y `updated_at` como una columna aparte (epoch) para poder consultarla.
+    Las operaciones bloqueantes se ejecutan en un hilo para no frenar el event loop.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = SQLITE_DEFAULT_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS guild_configs ("
+            "id INTEGER PRIMARY KEY, document TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_guild_configs_updated_at "
+            "ON guild_configs (updated_at)"
+        )
+        self._conn.commit()
+
+    def _select(self, guild_id: int) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT document FROM guild_configs WHERE id = ?", (guild_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, guild_id: int, document: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO guild_configs (id, document, updated_at) "
+            "VALUES (?, ?, ?)",
+            (guild_id, json.dumps(document), time.time()),
+        )
+
+    def _get_sync(self, guild_id: int) -> Optional[dict]:
+        with self._lock:
+            return self._select(guild_id)
+
+    def _get_many_sync(self, guild_ids: list) -> dict:
+        guild_ids = list(guild_ids)
+        if not guild_ids:
+            return {}
+        placeholders = ",".join("?" * len(guild_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT document FROM guild_configs WHERE id IN ({placeholders})",
+                guild_ids,
+            ).fetchall()
+        documents = (json.loads(row[0]) for row in rows)
+        return {document["_id"]: document for document in documents}
+
+    def _upsert_many_sync(self, updates: dict):
+        with self._lock, self._conn:
+            for guild_id, fields in updates.items():
+                self._write(guild_id, apply_fields(guild_id, self._select(guild_id), fields))
+
+    def _insert_if_missing_sync(self, guild_id: int, document: dict) -> Optional[dict]:
+        with self._lock, self._conn:
+            previous = self._select(guild_id)
+            if previous is None:
+                self._write(guild_id, document)
+            return previous
+
+    def _changed_since_sync(self, since: float) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT document FROM guild_configs WHERE updated_at > ?", (since,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    async def get(self, guild_id: int) -> Optional[dict]:
+        return await asyncio.to_thread(self._get_sync, guild_id)
+
+    async def get_many(self, guild_ids: list) -> dict:
+        return await asyncio.to_thread(self._get_many_sync, guild_ids)
+
+    async def upsert_fields(self, guild_id: int, fields: dict):
+        await asyncio.to_thread(self._upsert_many_sync, {guild_id: fields})
+
+    async def upsert_many(self, updates: dict):
+        await asyncio.to_thread(self._upsert_many_sync, updates)
+
+    async def insert_if_missing(self, guild_id: int, document: dict) -> Optional[dict]:
+        return await asyncio.to_thread(self._insert_if_missing_sync, guild_id, document)
+
+    async def changed_since(self, since: datetime) -> list:
+        return await asyncio.to_thread(self._changed_since_sync, since.timestamp())
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ==============================================================================
+# Selección del backend según la configuración
+# ==============================================================================
+def create_backend(
+    kind: str = "mongo",
+    mongo_uri: Optional[str] = None,
+    sqlite_path: str = SQLITE_DEFAULT_PATH,
+    mongo_options: Optional[dict] = None,
+) -> StorageBackend:
+    """
+    Crea el backend de almacenamiento indicado.
+
+    Args:
+        kind (str): 'mongo', 'memory' o 'sqlite'.
+        mongo_uri (str, opcional): URI de conexión, requerida para 'mongo'.
+        sqlite_path (str): Ruta del archivo para 'sqlite'.
+        mongo_options (dict, opcional): Opciones extra del cliente de Motor
+            (tamaño del pool, timeouts, event listeners...).
+    """
+    kind = (kind or "mongo").lower()
+    if kind == "mongo":
+        return MotorBackend(mongo_uri, **(mongo_options or {}))
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(sqlite_path)
+    raise ValueError(f"Backend de almacenamiento desconocido: '{kind}'")
@@ -0,0 +1,88 @@
+# app/core/streaming.py
+import time
+from typing import Awaitable, Callable, Optional
+
+import discord
+
+DISCORD_MESSAGE_LIMIT = 2000  # Caracteres máximos por mensaje de Discord
+# Discord permite ~5 ediciones cada 5 s por canal; se deja margen para otros mensajes
+EDIT_INTERVAL = 1.5
+
+
+def split_point(text: str, limit: int = DISCORD_MESSAGE_LIMIT) -> int:
+    """Posición donde cortar `text` para no superar `limit` (prefiere saltos de línea y espacios)."""
+    if len(text) <= limit:
+        return len(text)
+    for separator in ("\n", " "):
+        index = text.rfind(separator, 0, limit)
+        if index > limit // 2:
+            return index + 1
+    return limit
+
+
+def split_message(text: str, limit: int = DISCORD_MESSAGE_LIMIT) -> list[str]:
+    """Divide un texto largo en partes que entran en un mensaje de Discord."""
+    parts = []
+    while text:
+        index = split_point(text, limit)
+        part, text = text[:index].rstrip(), text[index:].lstrip()
+        if part:
+            parts.append(part)
+    return parts
+
+
+# ==============================================================================
+# Respuesta progresiva
+# ==============================================================================
+class StreamingReply:
+    """
+    Publica una respuesta a medida que llegan los fragmentos del modelo: el primer
+    fragmento se envía apenas llega y luego el mensaje se edita como mucho una vez cada
+    `edit_interval` segundos. Al superar el límite de 2000 caracteres, el mensaje actual se
+    cierra y el resto continúa en un mensaje nuevo.
+    """
+
+    def __init__(
+        self,
+        reply: Callable[[str], Awaitable[discord.Message]],
+        send: Callable[[str], Awaitable[discord.Message]],
+        edit_interval: float = EDIT_INTERVAL,
+        limit: int = DISCORD_MESSAGE_LIMIT,
+    ):
+        self._reply = reply  # Primer mensaje (respuesta al usuario)
+        self._send = send  # Mensajes de continuación
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.messages: list[discord.Message] = []
+        self._message: Optional[discord.Message] = None
+        self._text = ""  # Texto del mensaje actual
+        self._shown = ""  # Texto que Discord ya muestra en el mensaje actual
+        self._last_edit = 0.0
+
+    async def feed(self, text: str):
+        """Agrega un fragmento del modelo."""
+        self._text += text
+        while len(self._text) > self.limit:
+            index = split_point(self._text, self.limit)
+            head, self._text = self._text[:index].rstrip(), self._text[index:].lstrip()
+            await self._show(head, force=True)
+            self._message, self._shown = None, ""
+        await self._show(self._text)
+
+    async def finish(self):
+        """Publica el texto pendiente que quedó sin mostrar por el límite de ediciones."""
+        await self._show(self._text, force=True)
+
+    async def _show(self, text: str, force: bool = False):
+        if not text.strip() or text == self._shown:
+            return
+        now = time.monotonic()
+        if self._message is None:
+            self._message = await (self._send if self.messages else self._reply)(text)
+            self.messages.append(self._message)
+        elif force or now - self._last_edit >= self.edit_interval:
+            await self._message.edit(content=text)
+        else:
+            return
+        self._shown = text
+        self._last_edit = now
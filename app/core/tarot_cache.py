@@ -0,0 +1,157 @@
+# app/core/tarot_cache.py
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from .triggers import tokenize
+
+logger = logging.getLogger("discord")
+
+# ==============================================================================
+# Parámetros del caché de interpretaciones
+# ==============================================================================
+DEFAULT_MAX_SIZE = 2000
+DEFAULT_REUSE_PROBABILITY = 0.7  # Probabilidad de reutilizar una lectura ya generada
+SAVE_INTERVAL = 60.0  # Segundos mínimos entre escrituras a disco
+
+# Temas de pregunta: cualquier palabra de la lista ubica la pregunta en ese tema
+QUESTION_TOPICS = {
+    "amor": set(
+        "amor pareja novio novia relacion ex crush enamorado enamorada corazon "
+        "casamiento boda quiere ama sentimental".split()
+    ),
+    "trabajo": set(
+        "trabajo laburo empleo jefe carrera profesion empresa entrevista ascenso "
+        "negocio proyecto".split()
+    ),
+    "dinero": set(
+        "dinero plata guita economia deuda deudas finanzas sueldo ahorro inversion "
+        "loteria".split()
+    ),
+    "salud": set("salud enfermedad cuerpo medico curar sanar".split()),
+    "estudios": set(
+        "estudio estudios examen facultad universidad escuela curso".split()
+    ),
+    "familia": set(
+        "familia madre padre mama papa hermano hermana hijo hija".split()
+    ),
+    "amistad": set("amigo amiga amigos amigas amistad".split()),
+}
+# Palabras que no aportan al sentido de una pregunta libre
+STOPWORDS = set(
+    "a al con de del el en es la las lo los me mi mis que se si su un una y o por para "
+    "va voy como cual cuando donde este esta esto ir pasar pasara".split()
+)
+
+
+def question_bucket(question: str) -> str:
+    """
+    Clasifica una pregunta: por tema ('amor', 'trabajo', ...) si menciona alguno, o si no
+    por sus palabras significativas ordenadas, para que variantes triviales coincidan.
+    """
+    tokens = set(tokenize(question))
+    for topic, keywords in QUESTION_TOPICS.items():
+        if not tokens.isdisjoint(keywords):
+            return topic
+    return "q:" + " ".join(sorted(tokens - STOPWORDS))
+
+
+# ==============================================================================
+# Caché de interpretaciones
+# ==============================================================================
+class TarotInterpretationCache:
+    """
+    Interpretaciones de tarot memorizadas por tirada ordenada (carta, orientación) y tema
+    de la pregunta, con desalojo LRU. Un acierto solo se reutiliza con probabilidad
+    `reuse_probability`, así las lecturas siguen sintiéndose frescas; si no se reutiliza,
+    la nueva interpretación reemplaza a la anterior.
+    Si se indica `path`, el caché se carga y se guarda como JSON.
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        reuse_probability: float = DEFAULT_REUSE_PROBABILITY,
+        path: Optional[str] = None,
+    ):
+        self.max_size = max_size
+        self.reuse_probability = reuse_probability
+        self.path = path
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self._load()
+
+    @staticmethod
+    def key(cards: list, question: str) -> str:
+        spread = "|".join(f"{name}:{orientation}" for name, orientation in cards)
+        return f"{spread}|{question_bucket(question)}"
+
+    def get(self, cards: list, question: str) -> Optional[str]:
+        """Interpretación a reutilizar, o None si hay que generar una nueva."""
+        key = self.key(cards, question)
+        interpretation = self._entries.get(key)
+        if interpretation is None or random.random() >= self.reuse_probability:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return interpretation
+
+    def set(self, cards: list, question: str, interpretation: str):
+        key = self.key(cards, question)
+        self._entries[key] = interpretation
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    # ==============================================================================
+    # Persistencia
+    # ==============================================================================
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                entries = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo cargar el caché de tarot '{self.path}': {e}")
+            return
+        for key, interpretation in list(entries.items())[-self.max_size :]:
+            self._entries[key] = interpretation
+        logger.info(f"Caché de tarot cargado: {len(self._entries)} interpretaciones.")
+
+    def _write(self, entries: dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(entries, file, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    async def save(self, force: bool = False):
+        """Guarda el caché en disco si cambió (como mucho una vez por `SAVE_INTERVAL`)."""
+        if not self.path or not self._dirty:
+            return
+        if not force and time.monotonic() - self._last_save < SAVE_INTERVAL:
+            return
+        self._dirty = False
+        self._last_save = time.monotonic()
+        try:
+            await asyncio.to_thread(self._write, dict(self._entries))
+        except OSError as e:
+            self._dirty = True
+            logger.warning(f"No se pudo guardar el caché de tarot '{self.path}': {e}")
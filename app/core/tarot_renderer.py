@@ -0,0 +1,180 @@
+# app/core/tarot_renderer.py
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+
+logger = logging.getLogger("discord")
+
+# ==============================================================================
+# Formato de salida de las tiradas
+# ==============================================================================
+TAROT_FORMATS = {"WEBP": "webp", "JPEG": "jpg", "PNG": "png"}  # Formato -> extensión
+DEFAULT_FORMAT = "WEBP"
+DEFAULT_QUALITY = 80
+DEFAULT_WORKERS = 1
+CARD_MARGIN = 20  # Margen transparente a los lados de la tirada
+
+# Atlas del proceso actual: (archivo, invertida) -> imagen decodificada
+_ATLAS: dict[tuple, Image.Image] = {}
+
+
+# ==============================================================================
+# Funciones del worker (corren en el pool de procesos)
+# ==============================================================================
+def _load_atlas(folder: str, cards: tuple):
+    """Initializer del worker: decodifica todas las cartas y sus versiones invertidas."""
+    atlas = {}
+    for card in cards:
+        with Image.open(os.path.join(folder, card)) as image:
+            image.load()
+            upright = image.copy()
+        atlas[(card, False)] = upright
+        atlas[(card, True)] = upright.rotate(180)
+    _ATLAS.update(atlas)
+
+
+def _render_spread(spread: tuple, image_format: str, quality: int) -> bytes:
+    """Compone las cartas de la tirada y codifica el resultado."""
+    images = [_ATLAS[card] for card in spread]
+    total_width = sum(image.width for image in images) + CARD_MARGIN * 2
+    max_height = max(image.height for image in images)
+    canvas = Image.new("RGBA", (total_width, max_height), (255, 255, 255, 0))
+    x = CARD_MARGIN
+    for image in images:
+        canvas.paste(
+            image,
+            (x, (max_height - image.height) // 2),
+            image if image.mode == "RGBA" else None,
+        )
+        x += image.width
+
+    if image_format == "JPEG":
+        canvas = canvas.convert("RGB")  # JPEG no admite transparencia
+    buffer = BytesIO()
+    if image_format == "PNG":
+        canvas.save(buffer, format="PNG", optimize=True)
+    else:
+        canvas.save(buffer, format=image_format, quality=quality)
+    return buffer.getvalue()
+
+
+def _ping() -> bool:
+    return True
+
+
+# ==============================================================================
+# Renderizador de tiradas
+# ==============================================================================
+class TarotRenderer:
+    """
+    Renderiza tiradas de tarot en un pool de procesos, para que la composición y la
+    codificación no bloqueen el event loop. Cada worker decodifica una sola vez, al
+    arrancar, las 22 cartas y sus versiones rotadas 180° (el atlas); cada tirada solo
+    pega tres imágenes ya decodificadas y codifica el resultado (WEBP por defecto).
+
+    Si el pool no puede arrancar, se renderiza en un hilo con un atlas local; si se rompe
+    (muere un worker), se usa el hilo mientras se arranca un pool nuevo.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        cards: list,
+        image_format: str = DEFAULT_FORMAT,
+        quality: int = DEFAULT_QUALITY,
+        workers: int = DEFAULT_WORKERS,
+    ):
+        image_format = image_format.upper()
+        if image_format == "JPG":
+            image_format = "JPEG"
+        if image_format not in TAROT_FORMATS:
+            logger.warning(
+                f"Formato de tarot '{image_format}' no soportado. Se usa {DEFAULT_FORMAT}."
+            )
+            image_format = DEFAULT_FORMAT
+        self.folder = folder
+        self.cards = tuple(cards)
+        self.image_format = image_format
+        self.quality = quality
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._restart_task: Optional[asyncio.Task] = None
+
+    @property
+    def filename(self) -> str:
+        return f"tarot.{TAROT_FORMATS[self.image_format]}"
+
+    async def start(self):
+        """Arranca el pool y espera a que los workers carguen el atlas."""
+        # 'spawn' evita heredar por fork los hilos del proceso (Motor, discord.py)
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_atlas,
+            initargs=(self.folder, self.cards),
+        )
+        try:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(
+                *(loop.run_in_executor(pool, _ping) for _ in range(self.workers))
+            )
+        except Exception as e:
+            logger.error(f"No se pudo iniciar el pool de tarot, se usará un hilo: {e}")
+            pool.shutdown(wait=False)
+            return
+        # Hasta aquí las tiradas se renderizan en un hilo
+        self._pool = pool
+        logger.info(
+            f"Renderizador de tarot listo ({self.workers} proceso(s), {self.image_format})."
+        )
+
+    async def render(self, spread: list) -> bytes:
+        """
+        Renderiza una tirada.
+
+        Args:
+            spread (list): Tuplas (archivo_carta, invertida) en el orden de la tirada.
+        """
+        spread = tuple((card, bool(inverted)) for card, inverted in spread)
+        pool = self._pool
+        if pool is not None:
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    pool, _render_spread, spread, self.image_format, self.quality
+                )
+            except BrokenProcessPool as e:
+                # Solo un worker caído invalida el pool; los errores de la tirada se propagan
+                logger.error(f"El pool de tarot se rompió, se renderiza en un hilo: {e}")
+                self._restart(pool)
+        return await asyncio.to_thread(self._render_local, spread)
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        """Descarta un pool roto y arranca otro en segundo plano."""
+        if self._pool is not broken:
+            return  # Otra tirada ya lo descartó
+        self._pool = None
+        broken.shutdown(wait=False)
+        if self._restart_task is None or self._restart_task.done():
+            self._restart_task = asyncio.create_task(self.start())
+
+    def _render_local(self, spread: tuple) -> bytes:
+        if not _ATLAS:
+            _load_atlas(self.folder, self.cards)
+        return _render_spread(spread, self.image_format, self.quality)
+
+    def close(self):
+        if self._restart_task is not None:
+            self._restart_task.cancel()
+            self._restart_task = None
+        if self._pool is not None:
+            # Sin cancel_futures: las tiradas en curso terminan antes de que se cierre el pool
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -0,0 +1,81 @@
+# app/core/triggers.py
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Iterable, Optional
+
+# Todo lo que no sea letra o número separa tokens ("hola!" -> "hola")
+_NON_WORD = re.compile(r"[\W_]+")
+# Marca de fin de trigger dentro del trie (no puede colisionar con un token normalizado)
+_END = ""
+
+
+def normalize_text(text: str) -> str:
+    """Pasa a minúsculas, quita tildes/diéresis y reemplaza la puntuación por espacios."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", without_accents)
+
+
+def tokenize(text: str) -> list[str]:
+    """Divide un texto normalizado en tokens."""
+    return normalize_text(text).split()
+
+
+# ==============================================================================
+# Matcher de triggers compilado (trie de tokens)
+# ==============================================================================
+class TriggerMatcher:
+    """
+    Compila una lista de triggers (de una o varias palabras, ej. "buenos dias") en un trie
+    de tokens normalizados. `match` recorre el mensaje una sola vez y retorna el trigger
+    encontrado, en lugar de probar cada trigger contra la lista de tokens.
+    """
+
+    def __init__(self, triggers: Iterable[str]):
+        self._trie: dict = {}
+        self.max_length = 0
+        for trigger in triggers:
+            tokens = tokenize(trigger)
+            if not tokens:
+                continue
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node.setdefault(_END, trigger)
+            self.max_length = max(self.max_length, len(tokens))
+
+    def __bool__(self) -> bool:
+        return bool(self._trie)
+
+    def match(self, text: str) -> Optional[str]:
+        """
+        Retorna el primer trigger que aparece en el texto (el más largo si varios empiezan
+        en la misma palabra), o None si no hay coincidencias.
+        """
+        if not self._trie:
+            return None
+        tokens = tokenize(text)
+        trie = self._trie
+        for start, token in enumerate(tokens):
+            node = trie.get(token)
+            if node is None:
+                continue
+            found = node.get(_END)
+            for next_token in tokens[start + 1 : start + self.max_length]:
+                node = node.get(next_token)
+                if node is None:
+                    break
+                found = node.get(_END, found)
+            if found is not None:
+                return found
+        return None
+
+
+@lru_cache(maxsize=256)
+def compile_triggers(triggers: tuple) -> TriggerMatcher:
+    """
+    Compila (y memoriza) un matcher para una tupla de triggers, por ejemplo la lista
+    base más los triggers personalizados de un guild. Listas iguales comparten el matcher.
+    """
+    return TriggerMatcher(triggers)
@@ -6,7 +6,10 @@ from typing import Optional
 import discord
 from discord.ext import commands
 
+from .core.assets import AssetStore
 from .core.database import DatabaseManager
+from .core.event_context import begin_event, end_event
+from .core.message_router import MessageRouter
 
 from app.core.logging_handler import LoggingHandler
 
@@ -22,7 +25,13 @@ class Diami(commands.Bot):
     Clase principal para el bot Diami.
     """
 
-    def __init__(self, mongo_uri: str, guild_id: Optional[int] = None):
+    def __init__(
+        self,
+        mongo_uri: Optional[str],
+        guild_id: Optional[int] = None,
+        db_options: Optional[dict] = None,
+        options: Optional[dict] = None,
+    ):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.guilds = True
@@ -31,22 +40,54 @@ class Diami(commands.Bot):
         super().__init__(command_prefix=">", intents=intents)
 
         self.guild_id = guild_id
-        self.db_manager = DatabaseManager(mongo_uri)
+        # Opciones de los componentes ('ai', 'tarot', 'llm_scheduler', ...) leídas por ConfigLoader
+        self.options = options or {}
+        self.db_manager = DatabaseManager(mongo_uri, **(db_options or {}))
+
+        # Único listener de mensajes: los cogs registran sus handlers en el router
+        self.message_router = MessageRouter(self.db_manager)
+        self.add_listener(self.message_router.dispatch, "on_message")
+
+        # Íconos, imágenes y memes compartidos por los cogs, memorizados en memoria
+        self.assets = AssetStore(**self.options.get("assets", {}))
 
         logger.info(
             f"Diami inicializado. Guild de sincronización: {self.guild_id or 'Global'}"
         )
 
+    def dispatch(self, event_name: str, /, *args, **kwargs):
+        """
+        Fija un `EventContext` nuevo mientras se programan los listeners del evento,
+        para que todos compartan las búsquedas (configuración, canales) de ese evento.
+        """
+        token = begin_event(self, event_name)
+        try:
+            super().dispatch(event_name, *args, **kwargs)
+        finally:
+            end_event(token)
+
     async def on_guild_join(self, guild: discord.Guild):
         logger.info(
             f"¡El bot ha sido añadido al servidor: {guild.name} (ID: {guild.id})!"
         )
         await self.db_manager.create_guild_config(guild.id)
 
+    async def on_guild_remove(self, guild: discord.Guild):
+        logger.info(f"El bot fue removido del servidor: {guild.name} (ID: {guild.id}).")
+        self.db_manager.forget_guild(guild.id)
+
+    async def close(self):
+        """Cierra el bot asegurando que las escrituras pendientes lleguen a la base de datos."""
+        await self.db_manager.close()
+        await super().close()
+
     async def on_ready(self):
 
         logger.info(f"Conectado como {self.user} (ID: {self.user.id})")
 
+        # Precarga de configuraciones: una sola consulta para todos los guilds conectados
+        await self.db_manager.warm_guild_configs(guild.id for guild in self.guilds)
+
         await self.change_presence(
             activity=discord.CustomActivity(
                 name="🐍 Lista para matar a dios, o convertirme en el!",
@@ -72,6 +113,9 @@ class Diami(commands.Bot):
         except Exception as e:
             logging.error(f"Error al configurar el LoggingHandler: {e}", exc_info=True)
 
+        # Sincronización de la caché de configuraciones con otros procesos (si está activada)
+        self.db_manager.start_change_watcher()
+
         # --- Sincronización de Comandos Slash ---
 
         logger.info("--- Cargando Cogs ---")
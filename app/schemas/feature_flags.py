@@ -14,3 +14,15 @@ def get_default_feature_flags() -> dict:
         "welcome_message_enabled": False,  # Para mensajes de bienvenida
         "feliz_jueves_task_enabled": False,  # Para la tarea periódica de "Feliz Jueves"
     }
+
+
+# ==============================================================================
+# Representación compacta de las características (bitmask)
+# ==============================================================================
+# Cada característica ocupa un bit, en el orden en que aparece en el schema por defecto.
+FEATURE_BITS = {name: 1 << index for index, name in enumerate(get_default_feature_flags())}
+
+# Máscara con los valores por defecto de todas las características.
+DEFAULT_FEATURE_MASK = sum(
+    FEATURE_BITS[name] for name, enabled in get_default_feature_flags().items() if enabled
+)
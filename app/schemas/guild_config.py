@@ -1,5 +1,31 @@
 # app/schemas/guild_config.py
-from .feature_flags import get_default_feature_flags
+from typing import Optional
+
+from .feature_flags import DEFAULT_FEATURE_MASK, FEATURE_BITS, get_default_feature_flags
+
+# ==============================================================================
+# Campos de canales de la configuración
+# ==============================================================================
+CHANNEL_FIELDS = (
+    "main_channel_id",
+    "log_channel_id",
+    "rules_channel_id",
+    "history_channel_id",
+    "confession_channel_id",
+    "report_channel_id",
+    "suggestion_channel_id",
+)
+
+# Rol que cumple cada canal configurado (usado por el índice inverso canal -> rol).
+CHANNEL_ROLES = {
+    "main_channel_id": "main",
+    "log_channel_id": "log",
+    "rules_channel_id": "rules",
+    "history_channel_id": "history",
+    "confession_channel_id": "confession",
+    "report_channel_id": "report",
+    "suggestion_channel_id": "suggestion",
+}
 
 
 # ==============================================================================
@@ -24,3 +50,60 @@ def get_default_guild_config(guild_id: int) -> dict:
         "suggestion_channel_id": None,
         "features": get_default_feature_flags(),
     }
+
+
+# ==============================================================================
+# Configuración tipada del servidor (guild)
+# ==============================================================================
+class GuildConfig:
+    """
+    Representación compacta en memoria de la configuración de un servidor.
+    Los IDs de canales son atributos y las características se empaquetan en un bitmask,
+    por lo que consultar un flag es un test de bits en lugar de búsquedas en diccionarios anidados.
+    """
+
+    __slots__ = ("guild_id", "flags", *CHANNEL_FIELDS)
+
+    def __init__(self, guild_id: int, flags: int = DEFAULT_FEATURE_MASK, **channels):
+        self.guild_id = guild_id
+        self.flags = flags
+        for field in CHANNEL_FIELDS:
+            setattr(self, field, channels.get(field))
+
+    @classmethod
+    def from_document(cls, document: Optional[dict]) -> Optional["GuildConfig"]:
+        """Construye la configuración a partir de un documento de la base de datos."""
+        if document is None:
+            return None
+        config = cls(
+            document["_id"],
+            **{field: document.get(field) for field in CHANNEL_FIELDS},
+        )
+        for name, status in (document.get("features") or {}).items():
+            config.set_feature(name, status)
+        return config
+
+    def has_feature(self, feature_name: str) -> bool:
+        """Indica si una característica está activada (las desconocidas cuentan como desactivadas)."""
+        return bool(self.flags & FEATURE_BITS.get(feature_name, 0))
+
+    def set_feature(self, feature_name: str, status: bool):
+        """Activa o desactiva una característica. Las desconocidas se ignoran."""
+        bit = FEATURE_BITS.get(feature_name)
+        if bit is None:
+            return
+        if status:
+            self.flags |= bit
+        else:
+            self.flags &= ~bit
+
+    def apply_fields(self, fields: dict):
+        """Aplica un `$set` (claves en notación de punto) como lo haría la base de datos."""
+        for key, value in fields.items():
+            if key.startswith("features."):
+                self.set_feature(key[len("features.") :], value)
+            elif key in CHANNEL_FIELDS:
+                setattr(self, key, value)
+
+    def __repr__(self) -> str:
+        return f"<GuildConfig guild_id={self.guild_id} flags={self.flags:#b}>"
@@ -33,15 +33,118 @@ class ConfigLoader:
         self.mongo_uri = os.getenv("MONGO_URI")
         self.guild_id = self._parse_guild_id(os.getenv("GUILD_ID"))
         self.session_secret = os.getenv("SESSION_SECRET_KEY")
+        # Backend de almacenamiento: 'mongo' (por defecto), 'sqlite' o 'memory'
+        self.storage_backend = os.getenv("STORAGE_BACKEND", "mongo").lower()
+        # Opciones del DatabaseManager (solo se incluyen las definidas en el entorno)
+        self.db_options = {}
+        self.db_options["storage_backend"] = self.storage_backend
+        if os.getenv("SQLITE_PATH"):
+            self.db_options["sqlite_path"] = os.getenv("SQLITE_PATH")
+        self._load_number("CONFIG_CACHE_TTL", "cache_ttl", float)
+        self._load_number("CONFIG_CACHE_SIZE", "cache_max_size", int)
+        self._load_number("CONFIG_FLUSH_INTERVAL", "flush_interval", float)
+        self._load_number("CONFIG_POLL_INTERVAL", "poll_interval", float)
+        self._load_flag("CONFIG_WRITE_BEHIND", "write_behind")
+        self._load_flag("CONFIG_WATCH_CHANGES", "watch_changes")
+        # Opciones del pool de conexiones de MongoDB
+        self.mongo_options = {}
+        for env_name, option in (
+            ("MONGO_MAX_POOL_SIZE", "maxPoolSize"),
+            ("MONGO_MIN_POOL_SIZE", "minPoolSize"),
+            ("MONGO_MAX_IDLE_TIME_MS", "maxIdleTimeMS"),
+            ("MONGO_WAIT_QUEUE_TIMEOUT_MS", "waitQueueTimeoutMS"),
+            ("MONGO_CONNECT_TIMEOUT_MS", "connectTimeoutMS"),
+            ("MONGO_SERVER_SELECTION_TIMEOUT_MS", "serverSelectionTimeoutMS"),
+        ):
+            self._load_number(env_name, option, int, target=self.mongo_options)
+        if self.mongo_options:
+            self.db_options["mongo_options"] = self.mongo_options
+        # Opciones de los componentes del bot, agrupadas por componente
+        self.bot_options = self._load_bot_options()
 
     @staticmethod
     def _parse_guild_id(guild_id_str):
         return int(guild_id_str) if guild_id_str and guild_id_str.isdigit() else None
 
+    def _load_bot_options(self) -> dict:
+        """
+        Lee las opciones de los componentes del bot (IA, tarot, assets). Cada clave
+        corresponde a un componente y solo contiene las opciones definidas en el entorno.
+        """
+        options = {
+            "prompt_budget": {},
+            "ai": {},
+            "llm_scheduler": {},
+            "tarot_renderer": {},
+            "tarot": {},
+            "tarot_cache": {},
+            "assets": {},
+        }
+        # Presupuesto de tokens por tipo de llamada (AI_TOKEN_BUDGET_MENTION, ...)
+        for call_type in ("mention", "greeting", "proactive", "command"):
+            self._load_number(
+                f"AI_TOKEN_BUDGET_{call_type.upper()}",
+                call_type,
+                int,
+                options["prompt_budget"],
+            )
+        self._load_flag("AI_CONTEXT_CACHE", "context_cache", options["ai"])
+        self._load_number("AI_CONTEXT_CACHE_TTL", "context_cache_ttl", float, options["ai"])
+        for env_name, option, cast in (
+            ("LLM_MAX_CONCURRENCY", "max_concurrency", int),
+            ("LLM_REQUESTS_PER_MINUTE", "requests_per_minute", float),
+            ("LLM_BURST", "burst", int),
+            ("LLM_MAX_QUEUE", "max_queue", int),
+            ("LLM_SHED_DEPTH", "shed_depth", int),
+        ):
+            self._load_number(env_name, option, cast, options["llm_scheduler"])
+        self._load_flag("AI_STREAMING", "streaming", options["ai"])
+        self._load_text("TAROT_IMAGE_FORMAT", "image_format", options["tarot_renderer"])
+        self._load_number("TAROT_IMAGE_QUALITY", "quality", int, options["tarot_renderer"])
+        self._load_number("TAROT_RENDER_WORKERS", "workers", int, options["tarot_renderer"])
+        self._load_number("TAROT_AI_TIMEOUT", "ai_timeout", float, options["tarot"])
+        self._load_number("TAROT_CACHE_SIZE", "max_size", int, options["tarot_cache"])
+        self._load_number(
+            "TAROT_CACHE_REUSE", "reuse_probability", float, options["tarot_cache"]
+        )
+        self._load_text("TAROT_CACHE_PATH", "path", options["tarot_cache"])
+        self._load_number(
+            "ASSET_MAX_RESIDENT_BYTES", "max_resident_bytes", int, options["assets"]
+        )
+        return options
+
+    def _load_number(self, env_name: str, option: str, cast, target: dict = None):
+        """Lee una variable de entorno numérica y la guarda en db_options (o `target`) si es válida."""
+        value = os.getenv(env_name)
+        if not value:
+            return
+        try:
+            (self.db_options if target is None else target)[option] = cast(value)
+        except ValueError:
+            logging.warning(f"Valor inválido para {env_name}: '{value}'. Se ignora.")
+
+    def _load_flag(self, env_name: str, option: str, target: dict = None):
+        """Lee una variable de entorno booleana y la guarda en db_options (o `target`) si está definida."""
+        value = os.getenv(env_name, "").lower()
+        if value in ("1", "true", "yes"):
+            (self.db_options if target is None else target)[option] = True
+        elif value in ("0", "false", "no"):
+            (self.db_options if target is None else target)[option] = False
+
+    @staticmethod
+    def _load_text(env_name: str, option: str, target: dict):
+        """Guarda en `target` una variable de entorno de texto si está definida."""
+        if os.getenv(env_name):
+            target[option] = os.getenv(env_name)
+
     def validate(self):
         if not self.token:
             raise ValueError("¡ERROR! DISCORD_TOKEN no encontrado en .env")
-        if not self.mongo_uri:
+        if self.storage_backend not in ("mongo", "sqlite", "memory"):
+            raise ValueError(
+                f"¡ERROR! STORAGE_BACKEND inválido: '{self.storage_backend}' (mongo, sqlite o memory)"
+            )
+        if self.storage_backend == "mongo" and not self.mongo_uri:
             raise ValueError("¡ERROR! MONGO_URI no encontrado en .env")
 
 
@@ -91,7 +194,12 @@ class BotRunner:
 
     async def run(self):
         self.config.validate()
-        bot = Diami(mongo_uri=self.config.mongo_uri, guild_id=self.config.guild_id)
+        bot = Diami(
+            mongo_uri=self.config.mongo_uri,
+            guild_id=self.config.guild_id,
+            db_options=self.config.db_options,
+            options=self.config.bot_options,
+        )
         async with bot:
             await bot.start(self.config.token)
 